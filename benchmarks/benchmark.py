@@ -0,0 +1,154 @@
+"""
+Scenario benchmarks running the downloader against the mock Zoom API server in benchmarks/mock_zoom.py:
+
+	python benchmarks/benchmark.py scan --users 1 10 50 --meetings 10 100
+	python benchmarks/benchmark.py download --parallel 1 2 4 8 --files 40 --file-size 8
+
+Each run uses config_template.py with the settings of the scenario, and the config files given with --config after it
+(e.g. to change API_RATE_LIMITS).
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from mock_zoom import MB, mock_zoom_server
+
+ROOT_PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_PATH)
+
+import lib.utils as utils
+
+RUN_DOWNLOADER_PATH = os.path.join(ROOT_PATH, 'benchmarks', 'run_downloader.py')
+CONFIG_TEMPLATE_PATH = os.path.join(ROOT_PATH, 'config_template.py')
+
+
+def get_parser():
+	parser = argparse.ArgumentParser(description='Benchmark the downloader against a local mock of the Zoom API.')
+	parser.add_argument('--latency', type=float, default=0.02, help='Seconds the mock server adds to every request.')
+	parser.add_argument(
+		'--rate-limit-probability', type=float, default=0,
+		help='Probability of the mock server answering an API request with HTTP 429.'
+	)
+	parser.add_argument(
+		'--config', action='append', default=[],
+		help='Config file applied after the benchmark settings, can be given several times.'
+	)
+	scenarios = parser.add_subparsers(dest='scenario', required=True)
+
+	scan_parser = scenarios.add_parser('scan', help='Scan time (with --plan) by number of users and meetings.')
+	scan_parser.add_argument('--users', type=int, nargs='+', default=[1, 10, 50])
+	scan_parser.add_argument('--meetings', type=int, nargs='+', default=[10, 100], help='Recorded meetings per user.')
+
+	download_parser = scenarios.add_parser('download', help='Download throughput by number of parallel downloads.')
+	download_parser.add_argument('--parallel', type=int, nargs='+', default=[1, 2, 4, 8])
+	download_parser.add_argument('--files', type=int, default=40, help='Number of files to download.')
+	download_parser.add_argument('--file-size', type=float, default=8, help='Average file size in MB.')
+
+	return parser
+
+def run_downloader(server, settings, args=(), configs=()):
+	"""Run the downloader against the server in a new process, return its wall clock time and metrics."""
+	with tempfile.TemporaryDirectory() as work_path:
+		settings = {
+			'OUTPUT_PATH': os.path.join(work_path, 'output'), 'USERS': [],
+			'START_DAY': server.start_date.day, 'START_MONTH': server.start_date.month,
+			'START_YEAR': server.start_date.year, 'END_DAY': server.end_date.day, 'END_MONTH': server.end_date.month,
+			'END_YEAR': server.end_date.year, 'MANIFEST_PATH': None, 'RESPONSE_CACHE_PATH': None, 'JOURNAL_PATH': None,
+			'REFRESH_TOKENS_PATH': os.path.join(work_path, 'refresh_tokens.json'),
+			'METRICS_PATH': os.path.join(work_path, 'metrics.json'), 'VERBOSE_OUTPUT': False, **settings
+		}
+		settings_path = os.path.join(work_path, 'benchmark_config.py')
+		with open(settings_path, 'w', encoding='utf-8') as file:
+			file.writelines(f'{key} = {value!r}\n' for key, value in settings.items())
+
+		server.reset_counts()
+		start_time = time.monotonic()
+		process = subprocess.run(
+			[
+				sys.executable, RUN_DOWNLOADER_PATH, server.base_url, *args,
+				'--config', CONFIG_TEMPLATE_PATH, settings_path, *configs
+			],
+			cwd=work_path, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True, encoding='utf-8'
+		)
+		elapsed = time.monotonic() - start_time
+
+		metrics = _read_metrics(settings['METRICS_PATH'])
+		if process.returncode or not _gauge(metrics, 'last_run_success'):
+			raise Exception(f'The downloader failed:\n{process.stdout[-2000:]}')
+
+		return elapsed, metrics
+
+def benchmark_scan(args):
+	print_row('Users', 'Meetings', 'Time', 'API requests', 'Requests/s', 'HTTP 429', 'Rate limit wait')
+
+	for user_count in args.users:
+		for meeting_count in args.meetings:
+			server = mock_zoom_server(
+				user_count, meeting_count, latency=args.latency, rate_limit_probability=args.rate_limit_probability
+			)
+			with server:
+				elapsed, metrics = run_downloader(server, {}, ['--plan', 'plan.jsonl'], args.config)
+
+			api_requests = sum(
+				count for endpoint, count in server.request_counts.items() if endpoint not in ('token', 'download')
+			)
+			print_row(
+				user_count, meeting_count, f'{elapsed:.2f}s', api_requests, f'{api_requests / elapsed:.1f}',
+				_counter(metrics, 'api_retries_total', reason='HTTP 429'),
+				f'{_summary_sum(metrics, "api_rate_limit_wait_seconds"):.2f}s'
+			)
+
+def benchmark_download(args):
+	print_row('Parallel', 'Files', 'Size', 'Time', 'Speed', 'Files/s')
+
+	# A single user with one video file per meeting, so all the files are about the same size.
+	server = mock_zoom_server(1, args.files, int(args.file_size * MB), args.latency, args.rate_limit_probability)
+	with server:
+		for parallel_downloads in args.parallel:
+			settings = {
+				'MAX_PARALLEL_DOWNLOADS': parallel_downloads, 'RECORDING_FILE_TYPES': ['MP4'],
+				'INCLUDE_PARTICIPANT_AUDIO': False
+			}
+			elapsed, metrics = run_downloader(server, settings, configs=args.config)
+
+			# The time of the scan before the first download is included, as in a real run.
+			total_size = _counter(metrics, 'downloaded_bytes_total')
+			file_count = _counter(metrics, 'downloaded_files_total')
+			print_row(
+				parallel_downloads, file_count, utils.size_to_string(total_size), f'{elapsed:.2f}s',
+				f'{utils.size_to_string(total_size / elapsed)}/s', f'{file_count / elapsed:.1f}'
+			)
+
+def print_row(*values):
+	print('  '.join(f'{value!s:>15}' for value in values))
+
+def _read_metrics(path):
+	if not os.path.exists(path):
+		return {'counters': [], 'gauges': [], 'summaries': []}
+
+	with open(path, encoding='utf-8') as file:
+		return json.load(file)
+
+def _counter(metrics, name, **labels):
+	return sum(
+		counter['value'] for counter in metrics['counters']
+		if counter['name'] == name and labels.items() <= counter['labels'].items()
+	)
+
+def _summary_sum(metrics, name):
+	return sum(summary['sum'] for summary in metrics['summaries'] if summary['name'] == name)
+
+def _gauge(metrics, name):
+	return next((gauge['value'] for gauge in metrics['gauges'] if gauge['name'] == name), None)
+
+if __name__ == '__main__':
+	args = get_parser().parse_args()
+
+	if args.scenario == 'scan':
+		benchmark_scan(args)
+	else:
+		benchmark_download(args)
@@ -0,0 +1,251 @@
+import argparse
+import datetime
+import hashlib
+import json
+import os
+import random
+import re
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import lib.urls as urls
+
+MB = 1024 * 1024
+FILE_TYPES = (('MP4', 'MP4', 1), ('M4A', 'M4A', 0.1), ('CHAT', 'TXT', 0.001))
+DOWNLOAD_BLOCK_SIZE = 64 * 1024
+
+
+class mock_zoom_server:
+	"""
+	Local stand-in for the Zoom API endpoints in lib/urls.py, serving synthetic users and recordings. Requests can be
+	slowed down by a fixed latency, and API requests answered with HTTP 429 at random.
+	"""
+	def __init__(
+		self, user_count=3, meetings_per_user=20, file_size=1 * MB, latency=0, rate_limit_probability=0,
+		start_date=datetime.date(2023, 1, 1), end_date=datetime.date(2024, 12, 31), port=0, seed=0
+	):
+		self.user_count = user_count
+		self.meetings_per_user = meetings_per_user
+		self.file_size = file_size
+		self.latency = latency
+		self.rate_limit_probability = rate_limit_probability
+		self.start_date = start_date
+		self.end_date = end_date
+		self.seed = seed
+		self.random = random.Random(seed)
+		self.lock = threading.Lock()
+		self.request_counts = {}
+		self.server = ThreadingHTTPServer(('127.0.0.1', port), _make_handler(self))
+		self.server.daemon_threads = True
+		self.thread = None
+
+	@property
+	def base_url(self):
+		return f'http://127.0.0.1:{self.server.server_address[1]}'
+
+	def start(self):
+		self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+		self.thread.start()
+		return self
+
+	def stop(self):
+		self.server.shutdown()
+		self.server.server_close()
+
+	def __enter__(self):
+		return self.start()
+
+	def __exit__(self, *exc_info):
+		self.stop()
+
+	def reset_counts(self):
+		with self.lock:
+			self.request_counts = {}
+
+	def count(self, endpoint):
+		with self.lock:
+			self.request_counts[endpoint] = self.request_counts.get(endpoint, 0) + 1
+
+	def should_rate_limit(self):
+		with self.lock:
+			return self.random.random() < self.rate_limit_probability
+
+	def users(self):
+		return [
+			{
+				'id': f'user{i}', 'email': f'user{i}@example.com', 'first_name': 'User', 'last_name': str(i),
+				'created_at': f'{self.start_date}T00:00:00Z'
+			}
+			for i in range(self.user_count)
+		]
+
+	def user_meetings(self, email):
+		"""Return the user's meetings spread evenly over the date range, newest first as Zoom lists them."""
+		return [self.meeting(f'{email}-{i}==') for i in reversed(range(self.meetings_per_user))]
+
+	def meeting(self, uuid):
+		email, index = uuid[:-2].rsplit('-', 1)
+		days = (self.end_date - self.start_date).days
+		day = self.start_date + datetime.timedelta(days=days * int(index) // max(1, self.meetings_per_user - 1))
+		start_time = f'{day}T10:00:00Z'
+
+		recording_files = []
+		for type_index, (file_type, extension, _) in enumerate(FILE_TYPES):
+			# The last character of the file ID is its type, so downloads know the size without looking the file up.
+			file_id = hashlib.md5(f'{self.seed}{uuid}{file_type}'.encode()).hexdigest()[:-1] + str(type_index)
+			recording_files.append({
+				'id': file_id, 'meeting_id': uuid, 'recording_start': start_time, 'recording_end': f'{day}T11:00:00Z',
+				'file_type': file_type, 'file_extension': extension, 'file_size': self.synthetic_file_size(file_id),
+				'download_url': f'{self.base_url}/rec/download/{file_id}', 'status': 'completed',
+				'recording_type': 'shared_screen_with_speaker_view'
+			})
+
+		return {
+			'uuid': uuid, 'id': int(index), 'host_email': email, 'topic': f'Topic {int(index) % 5}',
+			'start_time': start_time, 'recording_files': recording_files
+		}
+
+	def synthetic_file_size(self, file_id):
+		# Sizes vary by up to 50% around the size of the file type, the same for every request of the same file.
+		size_ratio = FILE_TYPES[int(file_id[-1])][2]
+		variation = random.Random(file_id).uniform(0.5, 1.5)
+		return max(1, int(self.file_size * size_ratio * variation))
+
+def _make_handler(server):
+	class handler(BaseHTTPRequestHandler):
+		protocol_version = 'HTTP/1.1'
+
+		def log_message(self, *args):
+			pass
+
+		def do_POST(self):
+			self.rfile.read(int(self.headers.get('Content-Length') or 0))
+			url = urlparse(self.path)
+			if url.path != '/oauth/token':
+				return self.send_json({'code': 404, 'message': 'Not found.'}, 404)
+
+			server.count('token')
+			self.delay()
+			self.send_json({'access_token': f'token-{time.monotonic()}', 'token_type': 'bearer', 'expires_in': 3600})
+
+		def do_GET(self):
+			url = urlparse(self.path)
+			query = {key: values[0] for key, values in parse_qs(url.query).items()}
+
+			download_match = re.fullmatch(r'/rec/download/(\w+)', url.path)
+			if download_match:
+				server.count('download')
+				self.delay()
+				return self.send_file(download_match.group(1))
+
+			endpoint = urls.endpoint_name(url.path)
+			server.count(endpoint)
+			self.delay()
+			if server.should_rate_limit():
+				return self.send_json({'code': 429, 'message': 'Too many requests.'}, 429, {'Retry-After': '1'})
+
+			if endpoint == 'users':
+				users = server.users() if query.get('status', 'active') == 'active' else []
+				return self.send_page(users, 'users', query)
+
+			if endpoint == 'user_recordings':
+				email = unquote(url.path.split('/')[3])
+				from_date = datetime.date.fromisoformat(query['from'])
+				to_date = datetime.date.fromisoformat(query['to'])
+				meetings = [
+					meeting for meeting in server.user_meetings(email)
+					if from_date <= datetime.date.fromisoformat(meeting['start_time'][:10]) <= to_date
+				]
+				return self.send_page(meetings, 'meetings', query)
+
+			if endpoint == 'meeting_recordings':
+				# Meeting UUIDs are double encoded in the URL.
+				return self.send_json(server.meeting(unquote(unquote(url.path.split('/')[3]))))
+
+			self.send_json({'code': 404, 'message': 'Not found.'}, 404)
+
+		def delay(self):
+			if server.latency:
+				time.sleep(server.latency)
+
+		def send_page(self, items, key, query):
+			page_size = int(query.get('page_size', 30))
+			start = int(query.get('next_page_token') or 0)
+			next_start = start + page_size
+
+			self.send_json({
+				'page_count': -(-len(items) // page_size), 'page_size': page_size, 'total_records': len(items),
+				'next_page_token': str(next_start) if next_start < len(items) else '', key: items[start:next_start]
+			})
+
+		def send_json(self, value, status=200, headers=None):
+			body = json.dumps(value).encode()
+			self.send_response(status)
+			self.send_header('Content-Type', 'application/json')
+			self.send_header('Content-Length', str(len(body)))
+			for name, header_value in (headers or {}).items():
+				self.send_header(name, header_value)
+			self.end_headers()
+			self.wfile.write(body)
+
+		def send_file(self, file_id):
+			size = server.synthetic_file_size(file_id)
+			start, end, status = 0, size - 1, 200
+
+			range_match = re.fullmatch(r'bytes=(\d+)-(\d*)', self.headers.get('Range') or '')
+			if range_match:
+				start = int(range_match.group(1))
+				end = min(size - 1, int(range_match.group(2))) if range_match.group(2) else size - 1
+				status = 206
+
+			self.send_response(status)
+			self.send_header('Content-Type', 'application/octet-stream')
+			self.send_header('Content-Length', str(end - start + 1))
+			self.send_header('Accept-Ranges', 'bytes')
+			if status == 206:
+				self.send_header('Content-Range', f'bytes {start}-{end}/{size}')
+			self.end_headers()
+
+			# The content repeats a block derived from the file ID, so ranges of the same file always match.
+			seed = hashlib.sha256(file_id.encode()).digest()
+			block = seed * (DOWNLOAD_BLOCK_SIZE // len(seed))
+			position = start
+			while position <= end:
+				offset = position % len(block)
+				chunk = block[offset:offset + end - position + 1]
+				self.wfile.write(chunk)
+				position += len(chunk)
+
+	return handler
+
+def main():
+	parser = argparse.ArgumentParser(description='Serve a local stand-in for the Zoom API until interrupted.')
+	parser.add_argument('--port', type=int, default=8765)
+	parser.add_argument('--users', type=int, default=3, help='Number of users.')
+	parser.add_argument('--meetings', type=int, default=20, help='Number of recorded meetings per user.')
+	parser.add_argument('--file-size', type=float, default=1, help='Average size of the video files in MB.')
+	parser.add_argument('--latency', type=float, default=0, help='Seconds added to every request.')
+	parser.add_argument(
+		'--rate-limit-probability', type=float, default=0,
+		help='Probability of answering an API request with HTTP 429.'
+	)
+	args = parser.parse_args()
+
+	server = mock_zoom_server(
+		args.users, args.meetings, int(args.file_size * MB), args.latency, args.rate_limit_probability, port=args.port
+	)
+	print(f'Serving a mock Zoom API at {server.base_url}.')
+	try:
+		server.server.serve_forever()
+	except KeyboardInterrupt:
+		pass
+	finally:
+		server.server.server_close()
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,27 @@
+"""
+Run zoom_batch_downloader.py against another API server, e.g. the mock server:
+
+	python benchmarks/run_downloader.py http://127.0.0.1:8765 -c config.py
+"""
+import os
+import runpy
+import sys
+
+ROOT_PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_PATH)
+
+import lib.urls as urls
+
+ZOOM_API_URL = 'https://api.zoom.us'
+API_URL_FUNCTIONS = ('token', 'active_users', 'inactive_users', 'user_recordings', 'meeting_recordings', 'test')
+
+
+def redirect_api_urls(base_url):
+	for name in API_URL_FUNCTIONS:
+		url_function = getattr(urls, name)
+		setattr(urls, name, lambda *args, url_function=url_function: url_function(*args).replace(ZOOM_API_URL, base_url))
+
+if __name__ == '__main__':
+	redirect_api_urls(sys.argv[1].rstrip('/'))
+	sys.argv = [os.path.join(ROOT_PATH, 'zoom_batch_downloader.py')] + sys.argv[2:]
+	runpy.run_path(sys.argv[0], run_name='__main__')
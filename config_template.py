@@ -11,6 +11,9 @@ class server_to_server: CLIENT_ID: str; CLIENT_SECRET: str; ACCOUNT_ID: str
 @dataclass
 class oauth: CLIENT_ID: str; CLIENT_SECRET: str; auth_identifier: str
 
+@dataclass
+class account: NAME: str; CREDENTIALS: object; OUTPUT_PATH: str; USERS: list = None; TOPICS: list = None; RECORDING_FILE_TYPES: list = None
+
 ########################################################
 #               Zoom API credentials                   #
 # Pick one of the following as explained in the README #
@@ -30,6 +33,22 @@ CREDENTIALS = server_to_server(
 #     auth_identifier = R"############", # user-defined string. Can be left empty if you don't need multiple user/account support.
 # )
 
+# Multiple accounts - Uncomment to download from several Zoom accounts at the same time, instead of CREDENTIALS above.
+# Each account has its own credentials and output path. USERS, TOPICS and RECORDING_FILE_TYPES can be set per account,
+# otherwise the values set below are used. The accounts share the parallel downloads set below.
+# Accounts with OAuth credentials must each have a different auth_identifier.
+ACCOUNTS = [
+    # account(
+    #     NAME = R"############", # user-defined string, must be different for each account.
+    #     CREDENTIALS = server_to_server(
+    #         CLIENT_ID = R"############",
+    #         CLIENT_SECRET = R"###########",
+    #         ACCOUNT_ID = R"############",
+    #     ),
+    #     OUTPUT_PATH = R"C:\Test\Zoom\############",
+    # ),
+]
+
 ########################################################
 
 # Put your own download path here, no need to escape backslashes but avoid ending with one.
@@ -109,3 +128,97 @@ MINIMUM_FREE_DISK = 1 * GB
 # This was observed to happen sometimes on google drive mounted storage (mismatches of < 300 KBs).
 # Note: High tolerance might cause issues like corrupt downloads not being recognized by script.
 FILE_SIZE_MISMATCH_TOLERANCE = 0 * KB
+
+# Number of recording files to download at the same time. 1 downloads the files one by one.
+# Higher values can speed up large downloads considerably, a combined progress bar is shown in that case.
+MAX_PARALLEL_DOWNLOADS = 1
+
+# Number of Zoom API requests to make at the same time when scanning for meetings and recordings.
+# Lower it if you run into Zoom API rate limits.
+MAX_PARALLEL_SCANS = 4
+
+# If True, meetings are downloaded straight from the recordings listed for each user, and are only requested one by
+# one when some of their data is missing from the listing (e.g. participant audio files when included).
+SKIP_REDUNDANT_MEETING_LOOKUPS = True
+
+# Maximum number of Zoom API requests per second for each rate limit category of the endpoints used by the script.
+# The defaults match the limits of Pro accounts, Business accounts and higher can raise them, see:
+# https://developers.zoom.us/docs/api/rest/rate-limits/
+API_RATE_LIMITS = {
+    "light": 30,
+    "medium": 20,
+}
+
+# Number of times to retry a Zoom API request that was rate limited (HTTP 429) or failed on the server side (HTTP 5xx).
+API_MAX_RETRIES = 8
+
+# Maximum number of open connections kept alive per host for reuse between requests.
+# None sizes the pool to fit MAX_PARALLEL_SCANS, MAX_PARALLEL_DOWNLOADS and DOWNLOAD_SEGMENTS.
+CONNECTION_POOL_SIZE = None
+
+# Size of the chunks recording files are downloaded and written in. Larger chunks use less CPU on fast connections.
+DOWNLOAD_CHUNK_SIZE = 1 * MB
+
+# Recording files of at least this size are downloaded over several connections at once, which can be faster when
+# Zoom limits the speed of each connection. Set to None to always download over a single connection.
+SEGMENTED_DOWNLOAD_THRESHOLD = 500 * MB
+
+# Number of connections used for each file downloaded in segments.
+DOWNLOAD_SEGMENTS = 4
+
+# Path of the manifest keeping track of downloaded files, letting later runs skip them without checking the disk.
+# Run the script with --verify to check the manifest against the files on disk. Set to None to disable.
+# A manifest belongs to the OUTPUT_PATH it was created with, use a different manifest when changing OUTPUT_PATH.
+MANIFEST_PATH = "downloads_manifest.sqlite3"
+
+# If True, the scan of each user starts where their last completed scan ended instead of the start date above.
+# The end of the last scan is scanned again for the given number of days, to catch recordings that were processed late.
+# Requires MANIFEST_PATH, where the scanned dates are kept, separately for each --shard.
+INCREMENTAL_SYNC = False
+INCREMENTAL_OVERLAP_DAYS = 7
+
+# Path of the cache for Zoom API responses, making repeated runs scan much faster. Set to None to disable.
+# Run the script with --clear-cache to fetch everything again.
+RESPONSE_CACHE_PATH = "response_cache.sqlite3"
+
+# Maximum size of the cached responses, least recently used responses are removed first.
+RESPONSE_CACHE_MAX_SIZE = 200 * MB
+
+# Time in seconds responses are cached for, per endpoint. "past_recordings" is used for recordings listed for date
+# ranges that ended before the current month, "recent_recordings" for the rest.
+RESPONSE_CACHE_TTLS = {
+    "users": 24 * 60 * 60,
+    "past_recordings": 30 * 24 * 60 * 60,
+    "recent_recordings": 60 * 60,
+    "meeting_recordings": 7 * 24 * 60 * 60,
+}
+
+# Path of the journal recording the progress of the current run. If the run is interrupted, running the script again
+# with the same settings continues from where it stopped without repeating the work already done.
+# The journal is removed once the run completes, and each --shard keeps its own. Set to None to disable.
+JOURNAL_PATH = "run_journal.jsonl"
+
+# Maximum download speed in bytes per second, shared by all the downloads (and accounts) together. None for unlimited.
+MAX_DOWNLOAD_SPEED = None
+
+# Download speed limits for periods of the day in local time, used instead of MAX_DOWNLOAD_SPEED during those periods.
+# Periods can go over midnight, and None speed means unlimited.
+DOWNLOAD_SPEED_SCHEDULE = [
+    # ("09:00", "18:00", 2 * MB),   # Limited during work hours.
+    # ("18:00", "09:00", None),     # Full speed at night.
+]
+
+# Order to download the recording files in:
+#   "listed"   - User by user as Zoom lists their recordings, downloading while scanning.
+#   "newest"   - Most recent recordings first.
+#   "smallest" - Smallest files first, getting many files done quickly.
+#   "largest"  - Largest files first, keeping parallel downloads busy with long transfers.
+#   "fair"     - Taking turns between users, so every user gets some of their files early.
+# Other orders than "listed" scan all the users of an account before downloading.
+DOWNLOAD_ORDER = "listed"
+
+# Path of a file to write metrics about the run to when it ends: API requests and their latency per endpoint, retries,
+# token refreshes, download speeds, queue depths and time spent waiting on rate limits and disk space.
+# Paths ending with .json get a JSON summary, other paths a Prometheus text file (e.g. "/var/lib/node_exporter/zoom.prom"
+# for the node exporter textfile collector). Set to None to disable.
+METRICS_PATH = None
@@ -0,0 +1,111 @@
+import collections
+import datetime
+import threading
+import time
+
+import lib.utils as utils
+
+# The current speed is measured over the last few seconds.
+CURRENT_SPEED_WINDOW = 5
+
+
+class bandwidth_limiter:
+	"""
+	Paces the bytes downloaded by all threads together with a token bucket, the speed limit can change with the time of
+	day. Also measures the current and average download speed.
+	"""
+	def __init__(self, max_speed=None, schedule=None):
+		self.max_speed = max_speed
+		self.schedule = [(_parse_time(start), _parse_time(end), speed) for start, end, speed in schedule or []]
+		self.lock = threading.Lock()
+		self.tokens = 0
+		self.last_refill = time.monotonic()
+		self.start_time = None
+		self.total_size = 0
+		self.recent_sizes = collections.deque()
+		self.throttled_time = 0
+
+	def is_active(self):
+		return bool(self.max_speed or self.schedule)
+
+	def current_limit(self):
+		"""Return the speed limit in bytes per second for the current time of day, None if unlimited."""
+		now = datetime.datetime.now().time()
+		for start, end, speed in self.schedule:
+			if _is_between(now, start, end):
+				return speed
+
+		return self.max_speed
+
+	def consume(self, size):
+		"""Count downloaded bytes, waiting as long as needed to keep all downloads under the speed limit."""
+		with self.lock:
+			now = time.monotonic()
+			self._record(now, size)
+
+			limit = self.current_limit()
+			if not limit:
+				self.tokens, self.last_refill = 0, now
+				return
+
+			# Up to a second of unused speed is kept, so short pauses between chunks don't waste bandwidth.
+			# Tokens go negative when the limit is exceeded, which makes later threads wait their turn as well.
+			self.tokens = min(limit, self.tokens + (now - self.last_refill) * limit) - size
+			self.last_refill = now
+			wait = -self.tokens / limit if self.tokens < 0 else 0
+			self.throttled_time += wait
+
+		if wait > 0:
+			time.sleep(wait)
+
+	def _record(self, now, size):
+		if self.start_time is None:
+			self.start_time = now
+
+		self.total_size += size
+		self.recent_sizes.append((now, size))
+		while self.recent_sizes and self.recent_sizes[0][0] < now - CURRENT_SPEED_WINDOW:
+			self.recent_sizes.popleft()
+
+	def current_speed(self):
+		with self.lock:
+			now = time.monotonic()
+			while self.recent_sizes and self.recent_sizes[0][0] < now - CURRENT_SPEED_WINDOW:
+				self.recent_sizes.popleft()
+
+			if self.start_time is None:
+				return 0
+			window = min(CURRENT_SPEED_WINDOW, now - self.start_time)
+			return sum(size for _, size in self.recent_sizes) / window if window > 0 else 0
+
+	def average_speed(self):
+		with self.lock:
+			if self.start_time is None:
+				return 0
+			elapsed = time.monotonic() - self.start_time
+			return self.total_size / elapsed if elapsed > 0 else 0
+
+	def limit_description(self):
+		limit_str = f'{utils.size_to_string(self.max_speed)}/s' if self.max_speed else 'unlimited'
+		schedule_str = ''.join(
+			f', {start.strftime("%H:%M")}-{end.strftime("%H:%M")} '
+			f'{f"{utils.size_to_string(speed)}/s" if speed else "unlimited"}'
+			for start, end, speed in self.schedule
+		)
+		return f'Download speed limit: {limit_str}{schedule_str}.'
+
+	def statistics_description(self):
+		return (
+			f'Download speed: {utils.size_to_string(self.average_speed())}/s on average, '
+			f'{utils.size_to_string(self.current_speed())}/s currently, '
+			f'time spent throttled (summed over threads): {self.throttled_time:.1f}s.'
+		)
+
+def _parse_time(value):
+	return datetime.datetime.strptime(value, '%H:%M').time()
+
+def _is_between(time_of_day, start, end):
+	# Periods ending before they start go over midnight.
+	if start <= end:
+		return start <= time_of_day < end
+	return time_of_day >= start or time_of_day < end
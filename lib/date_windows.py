@@ -0,0 +1,58 @@
+import datetime
+
+# Zoom lists the recordings of up to a month per request.
+MAX_WINDOW_DAYS = 30
+
+
+class date_windows:
+	"""
+	Date windows to list a user's recordings by, oldest first, stepping MAX_WINDOW_DAYS days from the start date. The
+	windows before the user was created are skipped, they can't have any recordings.
+	"""
+	def __init__(self, start_date, end_date, created_date=None, max_days=MAX_WINDOW_DAYS):
+		self.start_date = start_date
+		self.end_date = end_date
+		self.created_date = created_date
+		self.max_days = max_days
+		self.skipped_count = sum(1 for window_end in self._window_ends() if created_date and window_end < created_date)
+
+	def __iter__(self):
+		window_start = self.start_date
+		for window_end in self._window_ends():
+			if not self.created_date or window_end >= self.created_date:
+				yield max(window_start, self.created_date or window_start), window_end
+			window_start = window_end + datetime.timedelta(days=1)
+
+	def __len__(self):
+		return sum(1 for _ in self)
+
+	def _window_ends(self):
+		window_end = self.start_date + datetime.timedelta(days=self.max_days - 1)
+		while window_end < self.end_date:
+			yield window_end
+			window_end += datetime.timedelta(days=self.max_days)
+
+		if self.start_date <= self.end_date:
+			yield self.end_date
+
+	def fixed_request_count(self, window_index, meeting_count, page_size):
+		"""Return the number of requests listing the window would have taken without skipping and splitting windows."""
+		# The windows skipped before the first one would have been listed empty, which still takes a request each.
+		skipped_count = self.skipped_count if window_index == 0 else 0
+		return skipped_count + max(1, -(-meeting_count // page_size))
+
+def split_window(start_date, end_date, page_count):
+	"""
+	Split a window needing several pages into as many windows as it has pages, or days if fewer. Pages can only be
+	listed one after the other, while the smaller windows can be listed in parallel.
+	"""
+	days = (end_date - start_date).days + 1
+	count = min(days, page_count)
+
+	return [
+		(
+			start_date + datetime.timedelta(days=days * i // count),
+			start_date + datetime.timedelta(days=days * (i + 1) // count - 1)
+		)
+		for i in range(count)
+	]
@@ -0,0 +1,122 @@
+import os
+import shutil
+import threading
+import time
+
+import lib.utils as utils
+
+# Free disk space is measured again after this many seconds, in between it's tracked from the reservations.
+REFRESH_INTERVAL = 15
+
+
+class disk_space_ledger:
+	"""
+	Reserves disk space for the downloads in progress, so parallel downloads together never go below the minimum free
+	disk space. Waiting downloads are woken up as soon as space is released, or when the disk is measured again.
+	Reservations stay taken off the measured free space until they are released, except for the bytes their files
+	already had on the disk when it was measured.
+	"""
+	def __init__(self, minimum_free_disk, timeout, refresh_interval=REFRESH_INTERVAL):
+		self.minimum_free_disk = minimum_free_disk
+		self.timeout = timeout
+		self.refresh_interval = refresh_interval
+		self.condition = threading.Condition()
+		self.volumes = {}
+		self.wait_time = 0
+
+	def reserve(self, file_path, size, cancel_event=None):
+		"""Wait until the file fits on its disk, then reserve its size and return the reservation."""
+		start_time = time.monotonic()
+		last_message_time = None
+		path = os.path.dirname(file_path)
+
+		with self.condition:
+			volume = self._get_volume(path)
+			while True:
+				now = time.monotonic()
+				if now - volume.measured_at >= self.refresh_interval:
+					volume.measure(path)
+
+				# A resumed download already has part of its file on the disk.
+				file_reservation = reservation(file_path, size, _allocated_size(file_path, size), now - start_time)
+				if volume.available() - file_reservation.unallocated() >= self.minimum_free_disk:
+					volume.reservations.add(file_reservation)
+					self.wait_time += now - start_time
+					return file_reservation
+
+				if cancel_event is not None and cancel_event.is_set():
+					raise InterruptedError('Download cancelled.')
+				if self.timeout is not None and now - start_time > self.timeout:
+					raise TimeoutError('Timeout waiting for disk space.')
+
+				if last_message_time is None or now - last_message_time >= self.refresh_interval:
+					last_message_time = now
+					self._print_waiting(volume, file_reservation)
+
+				self.condition.wait(max(0, self.refresh_interval - (now - volume.measured_at)))
+
+	def release(self, reservation, written):
+		"""Release a reservation, its bytes written since the last measurement are taken off the free space."""
+		with self.condition:
+			volume = self._get_volume(os.path.dirname(reservation.file_path))
+			volume.reservations.discard(reservation)
+			allocated = reservation.size if written else _allocated_size(reservation.file_path, reservation.size)
+			volume.free -= max(0, allocated - reservation.allocated)
+			self.condition.notify_all()
+
+	def _get_volume(self, path):
+		device = os.stat(path).st_dev
+		volume = self.volumes.get(device)
+		if volume is None:
+			volume = self.volumes[device] = _volume()
+			volume.measure(path)
+
+		return volume
+
+	def _print_waiting(self, volume, file_reservation):
+		reserved = sum(other.size for other in volume.reservations)
+		reserved_str = f', reserved by other downloads: {utils.size_to_string(reserved)}' if reserved else ''
+		required = file_reservation.unallocated() + volume.free - volume.available() + self.minimum_free_disk
+
+		utils.print_bright_red(
+			f'Waiting for disk space... '
+			f'(File size: {utils.size_to_string(file_reservation.size)}, '
+			f'minimum free disk space: {utils.size_to_string(self.minimum_free_disk)}{reserved_str}, '
+			f'available: {utils.size_to_string(max(0, volume.free))}/{utils.size_to_string(required)})'
+		)
+
+class reservation:
+	def __init__(self, file_path, size, allocated, wait_time):
+		self.file_path = file_path
+		self.size = size
+		# Bytes of the file on the disk when it was last measured.
+		self.allocated = allocated
+		self.wait_time = wait_time
+
+	def unallocated(self):
+		return max(0, self.size - self.allocated)
+
+class _volume:
+	def __init__(self):
+		self.free = 0
+		self.measured_at = 0
+		self.reservations = set()
+
+	def measure(self, path):
+		self.free = shutil.disk_usage(path).free
+		self.measured_at = time.monotonic()
+		for file_reservation in self.reservations:
+			file_reservation.allocated = _allocated_size(file_reservation.file_path, file_reservation.size)
+
+	def available(self):
+		return self.free - sum(file_reservation.unallocated() for file_reservation in self.reservations)
+
+def _allocated_size(file_path, size):
+	try:
+		stat = os.stat(file_path)
+	except FileNotFoundError:
+		return 0
+
+	# Files written out of order can be sparse, the allocated blocks are what is taken off the disk.
+	allocated = stat.st_blocks * 512 if hasattr(stat, 'st_blocks') else stat.st_size
+	return min(size, allocated)
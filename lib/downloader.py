@@ -0,0 +1,400 @@
+import base64
+import binascii
+import concurrent.futures
+import hashlib
+import json
+import os
+import threading
+import time
+from contextlib import nullcontext
+
+from tqdm import tqdm
+
+import lib.utils as utils
+
+REQUEST_TIMEOUT = 60
+PROGRESS_UPDATE_INTERVAL = 0.2
+RESUME_STATE_SAVE_INTERVAL = 2
+
+
+class file_progress_bar(tqdm):
+	def __init__(self, expected_size=None, dynamic_ncols=True):
+		r_bar = '| {n_fmt}{unit}/{total_fmt}{unit} [{elapsed}<{remaining}, {rate_fmt}{postfix}]'
+		format = '{l_bar}{bar}' + r_bar
+
+		tqdm.__init__(
+			self, total=expected_size, unit='B', unit_divisor=1024, unit_scale=True,
+			dynamic_ncols=dynamic_ncols, bar_format=format
+		)
+
+	def add(self, n):
+		self.update(n)
+
+class progress_reporter:
+	"""Batches progress updates so the progress bar isn't updated for every chunk written."""
+	def __init__(self, progress_bar, cancel_event=None):
+		self.progress_bar = progress_bar
+		self.cancel_event = cancel_event
+		self.pending = 0
+		self.reported = 0
+		self.last_update = time.monotonic()
+		self.lock = threading.Lock()
+
+	def add(self, n):
+		if self.cancel_event is not None and self.cancel_event.is_set():
+			raise InterruptedError('Download cancelled.')
+
+		with self.lock:
+			self.pending += n
+			now = time.monotonic()
+			if now - self.last_update >= PROGRESS_UPDATE_INTERVAL:
+				self._flush()
+				self.last_update = now
+
+	def flush(self):
+		with self.lock:
+			self._flush()
+
+	def _flush(self):
+		if self.pending:
+			self.progress_bar.add(self.pending)
+			self.reported += self.pending
+			self.pending = 0
+
+	def rollback(self):
+		with self.lock:
+			self.pending = 0
+			self.progress_bar.add(-self.reported)
+			self.reported = 0
+
+class range_not_supported(Exception):
+	pass
+
+def download_with_progress(
+	session, url, output_path, expected_size, verbose_output, size_tolerance, chunk_size, progress_bar=None,
+	cancel_event=None, segment_count=1, segment_threshold=None, bandwidth_limiter=None
+):
+	with nullcontext(progress_bar) if progress_bar else file_progress_bar(expected_size=expected_size) as bar:
+		progress = progress_reporter(bar, cancel_event)
+		try:
+			file_size, sha256, server_sha256 = None, None, None
+			if segment_count > 1 and segment_threshold is not None and expected_size >= segment_threshold:
+				try:
+					file_size, sha256 = _download_segmented(
+						session, url, output_path, expected_size, chunk_size, progress, segment_count, verbose_output,
+						bandwidth_limiter
+					)
+				except range_not_supported:
+					if verbose_output:
+						utils.print_dim_red('Server does not support segmented downloads, downloading over one connection.')
+
+			if file_size is None:
+				file_size, sha256, server_sha256 = _download(
+					session, url, output_path, expected_size, chunk_size, progress, verbose_output, bandwidth_limiter
+				)
+
+			progress.flush()
+			if abs(file_size - expected_size) > size_tolerance:
+				_remove_partial_file(output_path)
+				if verbose_output:
+					utils.print_dim_red(
+						f'Size mismatch: Expected {expected_size} bytes but got {file_size}. '
+						f'Size difference: {utils.size_to_string(abs(file_size - expected_size))}.\n'
+						f'You might want to increase FILE_SIZE_MISMATCH_TOLERANCE in config.py'
+					)
+				raise Exception(f'Failed to download file at {url}.{"" if verbose_output else " Enable verbose output for more details."}')
+
+			if server_sha256 and server_sha256 != sha256:
+				_remove_partial_file(output_path)
+				if verbose_output:
+					utils.print_dim_red(f'Checksum mismatch: Expected SHA-256 {server_sha256} but got {sha256}.')
+				raise Exception('Downloaded file does not match the checksum sent by the server.')
+
+			if progress_bar is None:
+				bar.total = file_size
+				bar.refresh()
+
+			if file_size != expected_size and verbose_output:
+				utils.print_dim_red(
+					f'Size mismatch within tolerance: Expected {expected_size} bytes but got {file_size}. '
+					f'Size difference: {utils.size_to_string(abs(file_size - expected_size))}.'
+				)
+
+			return sha256
+		except:
+			# The partial file is kept so the download can be resumed from where it stopped.
+			progress.rollback()
+			raise
+
+def _download(session, url, output_path, expected_size, chunk_size, progress, verbose_output, bandwidth_limiter):
+	resume_offset = _load_resume_offset(output_path, expected_size)
+	response, offset = _open_response(session, url, resume_offset)
+	with response:
+		if verbose_output and resume_offset:
+			if offset:
+				utils.print_dim(f'Resuming download at {utils.size_to_string(offset)}.')
+			else:
+				utils.print_dim_red('Server does not support resuming downloads, restarting download.')
+
+		file_size, sha256 = _write_response(
+			response, output_path, expected_size, chunk_size, progress, offset, bandwidth_limiter
+		)
+		return file_size, sha256, _server_sha256(response) if not offset else None
+
+def _open_response(session, url, offset):
+	headers = {'Range': f'bytes={offset}-'} if offset else None
+	response = session.get(url, stream=True, headers=headers, timeout=REQUEST_TIMEOUT)
+
+	if offset and (response.status_code == 416 or response.status_code == 206 and _content_range_start(response) != offset):
+		response.close()
+		return _open_response(session, url, 0)
+
+	response.raise_for_status()
+	return response, offset if response.status_code == 206 else 0
+
+def _content_range_start(response):
+	try:
+		return int(response.headers['Content-Range'].split()[1].split('-')[0])
+	except (KeyError, IndexError, ValueError):
+		return None
+
+def _server_sha256(response):
+	"""Return the SHA-256 of the whole file if the server sent one in a Repr-Digest or Digest header."""
+	for header in ('Repr-Digest', 'Digest'):
+		for digest in response.headers.get(header, '').split(','):
+			algorithm, _, value = digest.strip().partition('=')
+			if algorithm.lower() == 'sha-256' and value:
+				try:
+					return base64.b64decode(value.strip(':')).hex()
+				except (binascii.Error, ValueError):
+					return None
+
+	return None
+
+def _write_response(response, output_path, expected_size, chunk_size, progress, offset, bandwidth_limiter):
+	file_size = offset
+	progress.add(offset)
+
+	# The file is hashed as it's written, only the part downloaded before resuming has to be read again.
+	hash = utils.file_hash(output_path, offset) if offset else hashlib.sha256()
+
+	with open(output_path, 'r+b' if offset else 'wb') as file:
+		if offset:
+			file.seek(offset)
+		else:
+			_preallocate(file, expected_size)
+			_save_resume_offset(output_path, expected_size, 0)
+
+		last_save = time.monotonic()
+		try:
+			for chunk in response.iter_content(chunk_size=chunk_size):
+				file.write(chunk)
+				hash.update(chunk)
+				file_size += len(chunk)
+				progress.add(len(chunk))
+				if bandwidth_limiter:
+					bandwidth_limiter.consume(len(chunk))
+
+				if time.monotonic() - last_save >= RESUME_STATE_SAVE_INTERVAL:
+					file.flush()
+					_save_resume_offset(output_path, expected_size, file_size)
+					last_save = time.monotonic()
+		except:
+			file.flush()
+			_save_resume_offset(output_path, expected_size, file_size)
+			raise
+
+		file.truncate(file_size)
+
+	_remove_resume_state(output_path)
+	return file_size, hash.hexdigest()
+
+def _preallocate(file, size):
+	# Reserving the whole file upfront avoids fragmentation, not every platform or file system supports it.
+	if size > 0 and hasattr(os, 'posix_fallocate'):
+		try:
+			os.posix_fallocate(file.fileno(), 0, size)
+		except OSError:
+			pass
+
+def _download_segmented(
+	session, url, output_path, expected_size, chunk_size, progress, segment_count, verbose_output, bandwidth_limiter
+):
+	segments = _plan_segments(expected_size, segment_count, _load_resume_ranges(output_path, expected_size))
+	pending_segments = [segment for segment in segments if segment.position < segment.end]
+
+	# All the ranges are requested before anything is written, so an unsupported server falls back cleanly.
+	responses = []
+	try:
+		for segment in pending_segments:
+			responses.append(_open_segment_response(session, url, segment))
+	except:
+		for response in responses:
+			response.close()
+		raise
+
+	if verbose_output:
+		resumed_size = sum(segment.position - segment.start for segment in segments)
+		resumed_str = f', resuming at {utils.size_to_string(resumed_size)}' if resumed_size else ''
+		utils.print_dim(f'Downloading in {len(segments)} segments{resumed_str}.')
+
+	if not os.path.exists(output_path) or not os.path.exists(_resume_state_path(output_path)):
+		with open(output_path, 'wb') as file:
+			_preallocate(file, expected_size)
+
+	state = segments_resume_state(output_path, expected_size, segments)
+	state.save()
+	progress.add(sum(segment.position - segment.start for segment in segments))
+
+	stop_event = threading.Event()
+	with concurrent.futures.ThreadPoolExecutor(max_workers=len(responses) or 1) as executor:
+		futures = [
+			executor.submit(
+				_write_segment, response, output_path, segment, chunk_size, progress, state, stop_event, bandwidth_limiter
+			)
+			for response, segment in zip(responses, pending_segments)
+		]
+		try:
+			for future in concurrent.futures.as_completed(futures):
+				future.result()
+		except:
+			stop_event.set()
+			concurrent.futures.wait(futures)
+			state.save()
+			raise
+
+	for segment in segments[:-1]:
+		if segment.position != segment.end:
+			state.save()
+			raise Exception(f'Segment at {segment.start} ended after {segment.position - segment.start} bytes.')
+
+	file_size = segments[-1].position
+	with open(output_path, 'r+b') as file:
+		file.truncate(file_size)
+
+	_remove_resume_state(output_path)
+
+	# Segments arrive out of order, so the file is hashed once it's complete while it's still in the disk cache.
+	return file_size, utils.file_hash(output_path).hexdigest()
+
+class download_segment:
+	def __init__(self, start, end, position, last):
+		self.start = start
+		self.end = end
+		self.position = position
+		self.last = last
+
+def _plan_segments(expected_size, segment_count, resume_ranges):
+	resumed_positions = {start: end for start, end in resume_ranges}
+	segment_size = -(-expected_size // segment_count)
+	segments = []
+
+	for start in range(0, expected_size, segment_size):
+		end = min(start + segment_size, expected_size)
+		position = min(end, max(start, resumed_positions.get(start, start)))
+		segments.append(download_segment(start, end, position, last=end == expected_size))
+
+	return segments
+
+def _open_segment_response(session, url, segment):
+	# The last segment is left open ended, so it also picks up bytes beyond the size declared by Zoom.
+	range_end = '' if segment.last else segment.end - 1
+	response = session.get(
+		url, stream=True, headers={'Range': f'bytes={segment.position}-{range_end}'}, timeout=REQUEST_TIMEOUT
+	)
+
+	if response.status_code == 200 or response.status_code == 416 or (
+		response.status_code == 206 and _content_range_start(response) != segment.position
+	):
+		response.close()
+		raise range_not_supported()
+
+	try:
+		response.raise_for_status()
+	except:
+		response.close()
+		raise
+
+	return response
+
+def _write_segment(response, output_path, segment, chunk_size, progress, state, stop_event, bandwidth_limiter):
+	with response, open(output_path, 'r+b') as file:
+		file.seek(segment.position)
+		last_save = time.monotonic()
+
+		for chunk in response.iter_content(chunk_size=chunk_size):
+			if stop_event.is_set():
+				raise InterruptedError('Download cancelled.')
+
+			if not segment.last:
+				chunk = chunk[:segment.end - segment.position]
+			file.write(chunk)
+			segment.position += len(chunk)
+			progress.add(len(chunk))
+			if bandwidth_limiter:
+				bandwidth_limiter.consume(len(chunk))
+
+			if time.monotonic() - last_save >= RESUME_STATE_SAVE_INTERVAL:
+				file.flush()
+				state.save()
+				last_save = time.monotonic()
+
+		file.flush()
+
+class segments_resume_state:
+	def __init__(self, output_path, expected_size, segments):
+		self.output_path = output_path
+		self.expected_size = expected_size
+		self.segments = segments
+		self.lock = threading.Lock()
+
+	def save(self):
+		with self.lock:
+			_save_resume_ranges(
+				self.output_path, self.expected_size, [[segment.start, segment.position] for segment in self.segments]
+			)
+
+# Partial files are preallocated, so their size doesn't tell how much was downloaded. The downloaded ranges are kept
+# in a small file next to them instead.
+def _resume_state_path(output_path):
+	return output_path + '.progress'
+
+def _load_resume_ranges(output_path, expected_size):
+	if not os.path.exists(output_path):
+		return []
+
+	try:
+		with open(_resume_state_path(output_path), 'r') as file:
+			state = json.load(file)
+	except (OSError, ValueError):
+		return []
+
+	if state.get('size') != expected_size:
+		return []
+
+	file_size = os.path.getsize(output_path)
+	return [(start, min(end, file_size)) for start, end in state.get('ranges') or []]
+
+def _load_resume_offset(output_path, expected_size):
+	ranges = _load_resume_ranges(output_path, expected_size)
+	return ranges[0][1] if ranges and ranges[0][0] == 0 else 0
+
+def _save_resume_offset(output_path, expected_size, offset):
+	_save_resume_ranges(output_path, expected_size, [[0, offset]])
+
+def _save_resume_ranges(output_path, expected_size, ranges):
+	with open(_resume_state_path(output_path), 'w') as file:
+		json.dump({'size': expected_size, 'ranges': ranges}, file)
+
+def _remove_resume_state(output_path):
+	try:
+		os.remove(_resume_state_path(output_path))
+	except OSError:
+		pass
+
+def _remove_partial_file(output_path):
+	_remove_resume_state(output_path)
+	try:
+		os.remove(output_path)
+	except OSError:
+		pass
@@ -0,0 +1,124 @@
+import hashlib
+import json
+import os
+import threading
+
+
+class journal:
+	"""
+	Append only record of the work done by a run, letting an interrupted run continue where it stopped.
+	The journal only applies to runs with the same key, and is removed once a run completes.
+	"""
+	def __init__(self, path, run_key):
+		self.path = path
+		self.run_key = hashlib.sha256(json.dumps(run_key, sort_keys=True, default=str).encode()).hexdigest()
+		self.lock = threading.Lock()
+
+		self.users = None
+		self.user_created_dates = {}
+		self.done_users = set()
+		self.windows = {}
+		self.meetings = {}
+		self.files = set()
+		self.complete_size = 0
+		self.resumed = self._replay()
+
+		if self.resumed:
+			# Entries are appended after the last complete line, a line cut short by the interruption is dropped.
+			os.truncate(path, self.complete_size)
+		self.file = open(path, 'a' if self.resumed else 'w', encoding='utf-8')
+		if not self.resumed:
+			self._append({'event': 'run', 'key': self.run_key})
+
+	def _replay(self):
+		try:
+			with open(self.path, 'rb') as file:
+				content = file.read()
+		except FileNotFoundError:
+			return False
+
+		self.complete_size = content.rfind(b'\n') + 1
+		entries = []
+		for line in content[:self.complete_size].splitlines():
+			try:
+				entries.append(json.loads(line))
+			except ValueError:
+				pass
+
+		if not entries or entries[0].get('event') != 'run' or entries[0].get('key') != self.run_key:
+			return False
+
+		for entry in entries[1:]:
+			event = entry.get('event')
+			if event == 'users':
+				self.users = [tuple(user) for user in entry['users']]
+				self.user_created_dates = entry.get('created_dates', {})
+			elif event == 'window':
+				self.windows[_window_key(entry['user'], entry['from'], entry['to'])] = entry['meetings']
+			elif event == 'meeting':
+				self.meetings[entry['uuid']] = entry['meeting']
+			elif event == 'file':
+				self.files.add(entry['id'])
+			elif event == 'user':
+				self.done_users.add(entry['user'])
+
+		return True
+
+	def _append(self, entry):
+		with self.lock:
+			self.file.write(json.dumps(entry) + '\n')
+			self.file.flush()
+
+	def add_users(self, users, created_dates):
+		self.users = users
+		self.user_created_dates = created_dates
+		self._append({'event': 'users', 'users': users, 'created_dates': created_dates})
+
+	def get_window(self, user_email, from_date, to_date):
+		return self.windows.get(_window_key(user_email, from_date, to_date))
+
+	def add_window(self, user_email, from_date, to_date, meetings):
+		self._append({
+			'event': 'window', 'user': user_email, 'from': str(from_date), 'to': str(to_date),
+			'meetings': [_trim_meeting(meeting) for meeting in meetings]
+		})
+
+	def get_meeting(self, uuid):
+		return self.meetings.get(uuid)
+
+	def add_meeting(self, meeting):
+		self._append({'event': 'meeting', 'uuid': meeting['uuid'], 'meeting': _trim_meeting(meeting)})
+
+	def has_file(self, file_id):
+		return file_id in self.files
+
+	def add_file(self, file_id):
+		self._append({'event': 'file', 'id': file_id})
+
+	def is_user_done(self, user_email):
+		return user_email in self.done_users
+
+	def add_done_user(self, user_email):
+		self._append({'event': 'user', 'user': user_email})
+
+	def close(self):
+		with self.lock:
+			self.file.close()
+
+	def complete(self):
+		self.close()
+		try:
+			os.remove(self.path)
+		except OSError:
+			pass
+
+def _window_key(user_email, from_date, to_date):
+	return (user_email, str(from_date), str(to_date))
+
+def _trim_meeting(meeting):
+	"""Keep only what is needed to download the meeting's recordings, so the journal doesn't grow too large."""
+	return {
+		key: meeting[key]
+		for key in ('uuid', 'topic', 'start_time', 'recording_files', 'participant_audio_files')
+		if key in meeting
+	}
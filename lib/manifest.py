@@ -0,0 +1,151 @@
+import datetime
+import os
+import sqlite3
+import threading
+
+import lib.utils as utils
+
+
+class manifest:
+	"""
+	Local record of the downloaded recording files, keyed by their Zoom file id. The paths are relative to the output
+	folder the manifest was created for, a manifest is only used with that folder.
+	"""
+	def __init__(self, path, root_path):
+		self.path = path
+		self.lock = threading.Lock()
+		self.connection = sqlite3.connect(path, check_same_thread=False)
+		self.connection.execute('PRAGMA journal_mode=WAL')
+		self.connection.execute('PRAGMA synchronous=NORMAL')
+		self.connection.execute(
+			'CREATE TABLE IF NOT EXISTS files ('
+			'id TEXT PRIMARY KEY, path TEXT NOT NULL, size INTEGER NOT NULL, completed_at TEXT NOT NULL, sha256 TEXT)'
+		)
+		# Manifests written before checksums were recorded.
+		columns = [row[1] for row in self.connection.execute('PRAGMA table_info(files)')]
+		if 'sha256' not in columns:
+			self.connection.execute('ALTER TABLE files ADD COLUMN sha256 TEXT')
+		self.connection.execute(
+			'CREATE TABLE IF NOT EXISTS scanned_users ('
+			'email TEXT PRIMARY KEY, scanned_from TEXT NOT NULL, scanned_until TEXT NOT NULL)'
+		)
+		self.connection.execute('CREATE TABLE IF NOT EXISTS settings (key TEXT PRIMARY KEY, value TEXT NOT NULL)')
+		self._check_root_path(root_path)
+		self.connection.commit()
+
+		self.files = {
+			file_id: (path, size) for file_id, path, size in self.connection.execute('SELECT id, path, size FROM files')
+		}
+
+	def _check_root_path(self, root_path):
+		root_path = os.path.normcase(os.path.abspath(root_path))
+		row = self.connection.execute('SELECT value FROM settings WHERE key = ?', ('root_path',)).fetchone()
+
+		# Manifests written before the output folder was recorded are taken to belong to the current one.
+		if row is None:
+			self.connection.execute('INSERT INTO settings (key, value) VALUES (?, ?)', ('root_path', root_path))
+		elif row[0] != root_path:
+			self.connection.close()
+			raise Exception(
+				f'The downloads manifest {self.path} belongs to the output folder {row[0]}, not {root_path}. '
+				f'Set a different MANIFEST_PATH for this output folder, or delete the manifest to start over.'
+			)
+
+	def count(self):
+		return len(self.files)
+
+	def total_size(self):
+		return sum(size for _, size in self.files.values())
+
+	def has(self, file_id, path, size, size_tolerance):
+		entry = self.files.get(file_id)
+		return entry is not None and entry[0] == path and abs(entry[1] - size) <= size_tolerance
+
+	def add(self, file_id, path, size, sha256=None):
+		with self.lock:
+			self.files[file_id] = (path, size)
+			self.connection.execute(
+				'INSERT OR REPLACE INTO files (id, path, size, completed_at, sha256) VALUES (?, ?, ?, ?, ?)',
+				(file_id, path, size, datetime.datetime.now(datetime.timezone.utc).isoformat(), sha256)
+			)
+			self.connection.commit()
+
+	def set_sha256(self, file_id, sha256):
+		with self.lock:
+			self.connection.execute('UPDATE files SET sha256 = ? WHERE id = ?', (sha256, file_id))
+			self.connection.commit()
+
+	def remove(self, file_id):
+		with self.lock:
+			self.files.pop(file_id, None)
+			self.connection.execute('DELETE FROM files WHERE id = ?', (file_id,))
+			self.connection.commit()
+
+	def get_scanned_range(self, user_email, shard=None):
+		with self.lock:
+			row = self.connection.execute(
+				'SELECT scanned_from, scanned_until FROM scanned_users WHERE email = ?', (_scanned_key(user_email, shard),)
+			).fetchone()
+
+		return tuple(datetime.datetime.fromisoformat(value) for value in row) if row else None
+
+	def set_scanned_range(self, user_email, scanned_from, scanned_until, shard=None):
+		with self.lock:
+			self.connection.execute(
+				'INSERT OR REPLACE INTO scanned_users (email, scanned_from, scanned_until) VALUES (?, ?, ?)',
+				(_scanned_key(user_email, shard), scanned_from.isoformat(), scanned_until.isoformat())
+			)
+			self.connection.commit()
+
+	def verify(self, root_path):
+		"""Remove the entries of files that are missing from disk or whose size changed, return the removed count."""
+		removed_count = 0
+
+		for file_id, (path, size) in list(self.files.items()):
+			file_path = os.path.join(root_path, path)
+			if not os.path.isfile(file_path) or os.path.getsize(file_path) != size:
+				self.remove(file_id)
+				removed_count += 1
+
+		return removed_count
+
+	def verify_checksums(self, root_path, executor, workers, on_progress=None):
+		"""
+		Hash the files again and remove the entries of files that are missing or whose checksum changed, return the
+		checked and removed counts. Changed files are renamed with a .corrupt extension so they get downloaded again,
+		files downloaded without a checksum get the one computed now.
+		"""
+		with self.lock:
+			rows = self.connection.execute('SELECT id, path, size, sha256 FROM files').fetchall()
+
+		def hash_file(row):
+			file_path = os.path.join(root_path, row[1])
+			if not os.path.isfile(file_path) or os.path.getsize(file_path) != row[2]:
+				return None
+			return utils.file_hash(file_path).hexdigest()
+
+		checked_count, removed_count = 0, 0
+		hashes = utils.prefetching_map(executor, hash_file, rows, workers * 2)
+		for (file_id, path, size, sha256), actual_sha256 in zip(rows, hashes):
+			checked_count += 1
+			if actual_sha256 is None or sha256 and sha256 != actual_sha256:
+				if actual_sha256 is not None:
+					file_path = os.path.join(root_path, path)
+					os.replace(file_path, file_path + '.corrupt')
+				self.remove(file_id)
+				removed_count += 1
+			elif not sha256:
+				self.set_sha256(file_id, actual_sha256)
+
+			if on_progress:
+				on_progress(size)
+
+		return checked_count, removed_count
+
+	def close(self):
+		with self.lock:
+			self.connection.close()
+
+def _scanned_key(user_email, shard):
+	# Each shard only downloads its own files, so it keeps its own scanned range of the user.
+	return f'{user_email} shard {shard[0]}/{shard[1]}' if shard else user_email
@@ -0,0 +1,137 @@
+import contextlib
+import datetime
+import json
+import os
+import threading
+import time
+
+PREFIX = 'zoom_batch_downloader_'
+
+
+class metrics:
+	"""
+	Thread safe counters, gauges and summaries describing a run, exported as a Prometheus text file (for the node
+	exporter textfile collector) or as a JSON summary.
+	"""
+	def __init__(self):
+		self.lock = threading.Lock()
+		self.start_time = time.monotonic()
+		self.started_at = datetime.datetime.now(datetime.timezone.utc)
+		self.counters = {}
+		self.gauges = {}
+		self.summaries = {}
+		self.collectors = []
+
+	def add_collector(self, collector):
+		"""Add a function that records metrics kept elsewhere, called before exporting."""
+		self.collectors.append(collector)
+
+	def collect(self):
+		for collector in self.collectors:
+			collector()
+
+	def increment(self, name, value=1, **labels):
+		with self.lock:
+			key = (name, _label_key(labels))
+			self.counters[key] = self.counters.get(key, 0) + value
+
+	def set(self, name, value, **labels):
+		with self.lock:
+			self.gauges[(name, _label_key(labels))] = value
+
+	def observe(self, name, value, **labels):
+		"""Add a value to a summary, which keeps the count, sum and maximum of the observed values."""
+		with self.lock:
+			key = (name, _label_key(labels))
+			count, total, maximum = self.summaries.get(key, (0, 0, value))
+			self.summaries[key] = (count + 1, total + value, max(maximum, value))
+
+	@contextlib.contextmanager
+	def timer(self, name, **labels):
+		"""Observe the seconds spent in the with block."""
+		start = time.monotonic()
+		try:
+			yield
+		finally:
+			self.observe(name, time.monotonic() - start, **labels)
+
+	def wall_clock_time(self):
+		return time.monotonic() - self.start_time
+
+	def summary(self, name, **labels):
+		"""Return the count, sum and maximum of a summary, summed over all its labels unless some are given."""
+		count, total, maximum = 0, 0, 0
+		with self.lock:
+			for (summary_name, label_key), (summary_count, summary_total, summary_max) in self.summaries.items():
+				if summary_name == name and all(item in label_key for item in labels.items()):
+					count, total, maximum = count + summary_count, total + summary_total, max(maximum, summary_max)
+
+		return count, total, maximum
+
+	def counter(self, name, **labels):
+		with self.lock:
+			return sum(
+				value for (counter_name, label_key), value in self.counters.items()
+				if counter_name == name and all(item in label_key for item in labels.items())
+			)
+
+	def export(self, path):
+		"""Write the metrics to a JSON file if the path ends with .json, otherwise to a Prometheus text file."""
+		self.collect()
+		content = self.to_json() if path.lower().endswith('.json') else self.to_prometheus()
+
+		# The file is replaced at once, so collectors never read a half written file.
+		tmp_path = path + '.tmp'
+		with open(tmp_path, 'w', encoding='utf-8') as file:
+			file.write(content)
+		os.replace(tmp_path, path)
+
+	def to_prometheus(self):
+		lines = []
+		with self.lock:
+			for kind, values in (('counter', self.counters), ('gauge', self.gauges)):
+				for name in sorted({name for name, _ in values}):
+					lines.append(f'# TYPE {PREFIX}{name} {kind}')
+					for (value_name, label_key), value in sorted(values.items()):
+						if value_name == name:
+							lines.append(f'{PREFIX}{name}{_format_labels(label_key)} {value}')
+
+			for name in sorted({name for name, _ in self.summaries}):
+				lines.append(f'# TYPE {PREFIX}{name} summary')
+				for (summary_name, label_key), (count, total, _) in sorted(self.summaries.items()):
+					if summary_name == name:
+						lines.append(f'{PREFIX}{name}_count{_format_labels(label_key)} {count}')
+						lines.append(f'{PREFIX}{name}_sum{_format_labels(label_key)} {total}')
+
+		return '\n'.join(lines) + '\n'
+
+	def to_json(self):
+		def to_entries(values, to_value):
+			return [
+				{'name': name, 'labels': dict(label_key), **to_value(value)}
+				for (name, label_key), value in sorted(values.items())
+			]
+
+		with self.lock:
+			return json.dumps({
+				'started_at': self.started_at.isoformat(),
+				'wall_clock_seconds': self.wall_clock_time(),
+				'counters': to_entries(self.counters, lambda value: {'value': value}),
+				'gauges': to_entries(self.gauges, lambda value: {'value': value}),
+				'summaries': to_entries(
+					self.summaries,
+					lambda value: {'count': value[0], 'sum': value[1], 'max': value[2]}
+				),
+			}, indent=4)
+
+def _label_key(labels):
+	return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+def _format_labels(label_key):
+	if not label_key:
+		return ''
+
+	return '{' + ','.join(f'{key}="{_escape_label_value(value)}"' for key, value in label_key) + '}'
+
+def _escape_label_value(value):
+	return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
@@ -0,0 +1,70 @@
+import csv
+import json
+import threading
+
+import lib.utils as utils
+
+FIELDS = [
+	'file_id', 'path', 'file_name', 'file_size', 'file_type', 'user_email', 'topic', 'recording_start', 'url', 'account'
+]
+
+
+class plan_writer:
+	"""Writes download jobs to a JSON Lines file, or to a CSV file if the path ends with .csv."""
+	def __init__(self, path):
+		self.totals = plan_totals()
+		self.lock = threading.Lock()
+		self.file = open(path, 'w', newline='', encoding='utf-8')
+		self.csv_writer = None
+		if path.lower().endswith('.csv'):
+			self.csv_writer = csv.DictWriter(self.file, fieldnames=FIELDS)
+			self.csv_writer.writeheader()
+
+	def write(self, entry):
+		with self.lock:
+			self.totals.add(entry)
+			if self.csv_writer:
+				self.csv_writer.writerow(entry)
+			else:
+				self.file.write(json.dumps(entry) + '\n')
+
+	def close(self):
+		self.file.close()
+
+def read_plan(path):
+	with open(path, 'r', newline='', encoding='utf-8') as file:
+		if path.lower().endswith('.csv'):
+			for entry in csv.DictReader(file):
+				entry['file_size'] = int(entry['file_size'])
+				yield entry
+		else:
+			for line in file:
+				if line.strip():
+					yield json.loads(line)
+
+class plan_totals:
+	def __init__(self):
+		self.file_count = 0
+		self.total_size = 0
+		self.groups = {'user': {}, 'topic': {}, 'file type': {}}
+
+	def add(self, entry):
+		self.file_count += 1
+		self.total_size += entry['file_size']
+
+		for group, key in (('user', entry['user_email']), ('topic', entry['topic']), ('file type', entry['file_type'])):
+			count, size = self.groups[group].get(key, (0, 0))
+			self.groups[group][key] = (count + 1, size + entry['file_size'])
+
+	def print_summary(self, max_rows=20):
+		for group, totals in self.groups.items():
+			if not totals:
+				continue
+
+			utils.print_bright(f'Totals per {group}:')
+			rows = sorted(totals.items(), key=lambda item: item[1][1], reverse=True)
+			for key, (count, size) in rows[:max_rows]:
+				utils.print_dim(f'  {key}: {count} files, {utils.size_to_string(size)}')
+			if len(rows) > max_rows:
+				utils.print_dim(f'  ... and {len(rows) - max_rows} more.')
+			print()
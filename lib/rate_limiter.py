@@ -0,0 +1,127 @@
+import datetime
+import email.utils
+import random
+import threading
+import time
+
+
+class token_bucket:
+	def __init__(self, rate, capacity=None):
+		self.rate = rate
+		self.capacity = capacity or rate
+		self.tokens = self.capacity
+		self.last_refill = time.monotonic()
+		self.paused_until = 0
+
+	def refill(self, now):
+		self.tokens = min(self.capacity, self.tokens + (now - self.last_refill) * self.rate)
+		self.last_refill = now
+
+	def time_until_available(self, now):
+		if now < self.paused_until:
+			return self.paused_until - now
+
+		self.refill(now)
+		if self.tokens >= 1:
+			return 0
+
+		return (1 - self.tokens) / self.rate
+
+class rate_limiter:
+	"""Paces API requests with a token bucket per Zoom rate limit category, shared by all threads."""
+	def __init__(self, rates):
+		self.buckets = {category: token_bucket(rate) for category, rate in rates.items()}
+		self.lock = threading.Lock()
+		self.start_time = time.monotonic()
+		self.request_count = 0
+		self.throttled_count = 0
+		self.retry_count = 0
+		self.throttled_time = 0
+
+	def acquire(self, category):
+		bucket = self.buckets.get(category)
+		waited = 0
+
+		while True:
+			with self.lock:
+				now = time.monotonic()
+				wait = bucket.time_until_available(now) if bucket else 0
+				if wait <= 0:
+					if bucket:
+						bucket.tokens -= 1
+					self.request_count += 1
+					self.throttled_time += waited
+					return waited
+
+			time.sleep(wait)
+			waited += wait
+
+	def pause(self, category, seconds):
+		with self.lock:
+			bucket = self.buckets.get(category)
+			if bucket:
+				bucket.paused_until = max(bucket.paused_until, time.monotonic() + seconds)
+
+	def update(self, category, headers):
+		"""Stops sending requests for a moment when Zoom reports that the rate limit was reached."""
+		remaining = headers.get('X-RateLimit-Remaining')
+		if remaining is not None and remaining.isdigit() and int(remaining) == 0:
+			self.pause(category, 1)
+
+	def record_retry(self, throttled):
+		with self.lock:
+			self.retry_count += 1
+			if throttled:
+				self.throttled_count += 1
+
+	def statistics(self):
+		with self.lock:
+			elapsed = time.monotonic() - self.start_time
+
+			return {
+				'requests': self.request_count,
+				'requests_per_second': self.request_count / elapsed if elapsed > 0 else 0,
+				'throttled_responses': self.throttled_count,
+				'retries': self.retry_count,
+				'throttled_seconds': self.throttled_time,
+			}
+
+	def statistics_description(self):
+		stats = self.statistics()
+
+		return (
+			f'API requests: {stats["requests"]} ({stats["requests_per_second"]:.2f}/s), '
+			f'rate limited responses: {stats["throttled_responses"]}, retries: {stats["retries"]}, '
+			f'time spent throttled (summed over threads): {stats["throttled_seconds"]:.1f}s.'
+		)
+
+def retry_delay(response, attempt, max_delay=60):
+	"""Return how long to wait before retrying a failed request, preferring the delay asked for by the server."""
+	retry_after = _parse_retry_after(response.headers.get('Retry-After')) if response is not None else None
+	if retry_after is not None:
+		return retry_after
+
+	delay = min(max_delay, 2 ** attempt)
+	return delay / 2 + random.uniform(0, delay / 2)
+
+def _parse_retry_after(value):
+	if not value:
+		return None
+
+	try:
+		return max(0, float(value))
+	except ValueError:
+		pass
+
+	try:
+		retry_date = datetime.datetime.fromisoformat(value.replace('Z', '+00:00'))
+	except ValueError:
+		try:
+			retry_date = email.utils.parsedate_to_datetime(value)
+		except (TypeError, ValueError):
+			return None
+
+	if retry_date.tzinfo is None:
+		retry_date = retry_date.replace(tzinfo=datetime.timezone.utc)
+
+	return max(0, (retry_date - datetime.datetime.now(datetime.timezone.utc)).total_seconds())
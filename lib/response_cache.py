@@ -0,0 +1,107 @@
+import json
+import sqlite3
+import threading
+import time
+
+
+class response_cache:
+	"""Persistent cache of Zoom API responses with a time to live per endpoint category and LRU eviction."""
+	def __init__(self, path, max_size, ttls):
+		self.ttls = ttls
+		self.max_size = max_size
+		self.lock = threading.Lock()
+		self.hits = 0
+		self.misses = 0
+		self.evictions = 0
+
+		self.connection = sqlite3.connect(path, check_same_thread=False)
+		self.connection.execute('PRAGMA journal_mode=WAL')
+		self.connection.execute('PRAGMA synchronous=NORMAL')
+		self.connection.execute(
+			'CREATE TABLE IF NOT EXISTS responses ('
+			'url TEXT PRIMARY KEY, body TEXT NOT NULL, size INTEGER NOT NULL, expires_at REAL NOT NULL, last_used REAL NOT NULL)'
+		)
+		self.connection.execute('CREATE INDEX IF NOT EXISTS responses_last_used ON responses (last_used)')
+		self.connection.execute('DELETE FROM responses WHERE expires_at < ?', (time.time(),))
+		self.connection.commit()
+		self.size = self.connection.execute('SELECT COALESCE(SUM(size), 0) FROM responses').fetchone()[0]
+
+	def get(self, url):
+		now = time.time()
+
+		with self.lock:
+			row = self.connection.execute('SELECT body, expires_at FROM responses WHERE url = ?', (url,)).fetchone()
+			if row is None or row[1] < now:
+				self.misses += 1
+				return None
+
+			self.hits += 1
+			self.connection.execute('UPDATE responses SET last_used = ? WHERE url = ?', (now, url))
+			self.connection.commit()
+
+		return json.loads(row[0])
+
+	def put(self, url, category, value):
+		ttl = self.ttls.get(category) if category else None
+		if not ttl or not _is_complete(value):
+			return
+
+		body = json.dumps(value)
+		now = time.time()
+
+		with self.lock:
+			previous = self.connection.execute('SELECT size FROM responses WHERE url = ?', (url,)).fetchone()
+			self.connection.execute(
+				'INSERT OR REPLACE INTO responses (url, body, size, expires_at, last_used) VALUES (?, ?, ?, ?, ?)',
+				(url, body, len(body), now + ttl, now)
+			)
+			self.size += len(body) - (previous[0] if previous else 0)
+			self._evict()
+			self.connection.commit()
+
+	def _evict(self):
+		while self.size > self.max_size:
+			rows = self.connection.execute(
+				'SELECT url, size FROM responses ORDER BY last_used LIMIT 100'
+			).fetchall()
+			if not rows:
+				break
+
+			for url, size in rows:
+				self.connection.execute('DELETE FROM responses WHERE url = ?', (url,))
+				self.size -= size
+				self.evictions += 1
+				if self.size <= self.max_size:
+					break
+
+	def clear(self):
+		with self.lock:
+			self.connection.execute('DELETE FROM responses')
+			self.connection.commit()
+			self.size = 0
+
+	def statistics_description(self):
+		with self.lock:
+			lookups = self.hits + self.misses
+			hit_rate = self.hits / lookups * 100 if lookups else 0
+
+			return (
+				f'Response cache: {self.hits} hits, {self.misses} misses ({hit_rate:.0f}% hit rate), '
+				f'{self.evictions} evictions.'
+			)
+
+	def close(self):
+		with self.lock:
+			self.connection.close()
+
+def _is_complete(value):
+	"""Responses listing recordings that are still being processed by Zoom are not cached."""
+	pages = value if isinstance(value, list) else [value]
+
+	for page in pages:
+		for meeting in page.get('meetings') or [page]:
+			for recording_file in meeting.get('recording_files') or []:
+				if recording_file.get('status', 'completed') != 'completed':
+					return False
+
+	return True
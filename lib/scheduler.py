@@ -0,0 +1,61 @@
+import datetime
+import heapq
+import itertools
+
+ORDERS = ('listed', 'newest', 'smallest', 'largest', 'fair')
+
+
+class job_scheduler:
+	"""Queue of download jobs that hands them out in the given order, see DOWNLOAD_ORDER in the config template."""
+	def __init__(self, order):
+		check_order(order)
+		self.order = order
+		self.heap = []
+		self.counter = itertools.count()
+		self.user_job_counts = {}
+
+	def __len__(self):
+		return len(self.heap)
+
+	def add(self, job):
+		heapq.heappush(self.heap, (self._priority(job), next(self.counter), job))
+
+	def pop(self):
+		return heapq.heappop(self.heap)[-1]
+
+	def _priority(self, job):
+		if self.order == 'newest':
+			return -_timestamp(job.recording_start)
+		if self.order == 'smallest':
+			return job.file_size
+		if self.order == 'largest':
+			return -job.file_size
+		if self.order == 'fair':
+			# The n-th job of every user comes before the (n+1)-th job of any user.
+			user_job_count = self.user_job_counts.get(job.user_email, 0)
+			self.user_job_counts[job.user_email] = user_job_count + 1
+			return user_job_count
+		return 0
+
+def check_order(order):
+	if order not in ORDERS:
+		raise Exception(f'Unknown download order "{order}", expected one of: {", ".join(ORDERS)}.')
+
+def order_jobs(jobs, order):
+	"""Return the jobs in the given order, only the listed order doesn't need to collect all the jobs first."""
+	scheduler = job_scheduler(order)
+	if order == 'listed':
+		yield from jobs
+		return
+
+	for job in jobs:
+		scheduler.add(job)
+
+	while scheduler:
+		yield scheduler.pop()
+
+def _timestamp(recording_start):
+	try:
+		return datetime.datetime.strptime(recording_start, '%Y-%m-%dT%H:%M:%SZ').timestamp()
+	except (TypeError, ValueError):
+		return 0
@@ -0,0 +1,64 @@
+import threading
+import time
+
+# Zoom access tokens last an hour, this is only used if the token response doesn't say.
+DEFAULT_EXPIRES_IN = 3600
+REFRESH_MARGIN = 5 * 60
+
+
+class token_manager:
+	"""
+	Shares one access token between threads, renewing it shortly before it expires.
+	Only one thread fetches a new token at a time, the others keep using the current token while it's still valid,
+	or wait for the new one.
+	"""
+	def __init__(self, fetch_token, refresh_margin=REFRESH_MARGIN):
+		self.fetch_token = fetch_token
+		self.refresh_margin = refresh_margin
+		self.token = None
+		self.expires_at = 0
+		self.refreshing = False
+		self.refresh_count = 0
+		self.condition = threading.Condition()
+
+	def get(self):
+		with self.condition:
+			while True:
+				now = time.monotonic()
+				if self.token and now < self.expires_at - self.refresh_margin:
+					return self.token
+
+				if not self.refreshing:
+					self.refreshing = True
+					break
+
+				if self.token and now < self.expires_at:
+					return self.token
+
+				self.condition.wait()
+
+		return self._refresh()
+
+	def _refresh(self):
+		try:
+			token, expires_in = self.fetch_token()
+		except:
+			with self.condition:
+				self.refreshing = False
+				self.condition.notify_all()
+			raise
+
+		with self.condition:
+			self.token = token
+			self.expires_at = time.monotonic() + (expires_in or DEFAULT_EXPIRES_IN)
+			self.refreshing = False
+			self.refresh_count += 1
+			self.condition.notify_all()
+
+		return token
+
+	def invalidate(self, stale_token):
+		"""Drop a token rejected by Zoom, unless another thread already replaced it."""
+		with self.condition:
+			if self.token == stale_token:
+				self.token = None
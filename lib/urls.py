@@ -1,3 +1,7 @@
+import datetime
+import re
+from urllib.parse import parse_qs, urlparse
+
 import lib.utils as utils
 
 
@@ -25,5 +29,42 @@ def meeting_recordings(meeting_uuid):
 def test():
     return 'https://api.zoom.us/v2/users/me/recordings'
 
+def rate_limit_category(url):
+    if re.search(r'/v2/meetings/[^/]+/recordings', url):
+        return 'light'
+    return 'medium'
+
+def endpoint_name(url):
+    path = urlparse(url).path
+
+    if path == '/oauth/token':
+        return 'token'
+    if path == '/v2/users':
+        return 'users'
+    if re.fullmatch(r'/v2/users/[^/]+/recordings', path):
+        return 'user_recordings'
+    if re.fullmatch(r'/v2/meetings/[^/]+/recordings', path):
+        return 'meeting_recordings'
+    return 'other'
+
+def cache_category(url):
+    parsed_url = urlparse(url)
+
+    if parsed_url.path == '/v2/users':
+        return 'users'
+
+    if re.fullmatch(r'/v2/meetings/[^/]+/recordings', parsed_url.path):
+        return 'meeting_recordings'
+
+    if re.fullmatch(r'/v2/users/[^/]+/recordings', parsed_url.path):
+        # Recordings listed for date windows that ended before this month are very unlikely to change.
+        to_date = parse_qs(parsed_url.query).get('to', [None])[0]
+        month_start = datetime.date.today().replace(day=1)
+        if to_date and datetime.date.fromisoformat(to_date) < month_start:
+            return 'past_recordings'
+        return 'recent_recordings'
+
+    return None
+
 def _date_to_str(date):
 	return date.strftime('%Y-%m-%d')
\ No newline at end of file
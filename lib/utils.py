@@ -1,16 +1,18 @@
+import collections
+import concurrent.futures
+import hashlib
 import json
 import math
+import mmap
 import os
 import re
-import shutil
 import sys
-import time
+import threading
 import types
 import unicodedata
-import urllib
+import urllib.parse
 from functools import reduce
 from importlib.machinery import SourceFileLoader
-from time import sleep
 
 from colorama import Fore, Style
 from tqdm import tqdm
@@ -92,30 +94,23 @@ def slugify(value, allow_unicode=True):
 	value = re.sub(r'[^\w\s-]', '', value.lower())
 	return re.sub(r'[-\s]+', '-', value).strip('-_')
 
-def wait_for_disk_space(file_size, path, minimum_free_disk, poll_interval, timeout):
-	file_size_str = size_to_string(file_size)
-
-	free_disk = shutil.disk_usage(path)[2]
-	required_disk_space = file_size + minimum_free_disk
-	required_disk_space_str = size_to_string(required_disk_space)
-
-	i = 0
-	start_time = time.time()
-	while free_disk < required_disk_space:
-		if i % 3 == 0:
-			free_disk_str = size_to_string(free_disk)
-			minimum_free_disk_str = size_to_string(minimum_free_disk)
-
-			print_bright_red(
-				f'Waiting for disk space... '
-				f'(File size: {file_size_str}, minimum free disk space: {minimum_free_disk_str}, '
-				f'available: {free_disk_str}/{required_disk_space_str})'
-			)
-		if timeout is not None and time.time() - start_time > timeout:
-			raise TimeoutError("Timeout waiting for disk space.")
-		sleep(poll_interval)
-		free_disk = shutil.disk_usage(path)[2]
-		i += 1
+def file_hash(path, size=None):
+	"""Return a SHA-256 hash object of the first size bytes of the file (all of it by default), read through a memory map."""
+	hash = hashlib.sha256()
+
+	with open(path, 'rb') as file:
+		file_size = os.fstat(file.fileno()).st_size
+		size = file_size if size is None else min(size, file_size)
+		if size:
+			with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped, memoryview(mapped) as view:
+				with view[:size] as data:
+					hash.update(data)
+
+	return hash
+
+def shard_of(key, shard_count):
+	"""Return the shard of a key, stable across processes and machines unlike the built in hash()."""
+	return int.from_bytes(hashlib.sha256(str(key).encode()).digest()[:8], 'big') % shard_count
 
 def size_to_string(size_bytes, separator = ''):
 	if size_bytes == 0:
@@ -133,60 +128,13 @@ def print_bright_blue(msg, end='\n'):
 	print_bright(Fore.BLUE + str(msg) + Fore.RESET, end=end)
 
 def print_bright(msg, end='\n'):
-	print(Style.BRIGHT + str(msg) + Style.RESET_ALL, end=end)
+	tqdm.write(Style.BRIGHT + str(msg) + Style.RESET_ALL, end=end)
 
 def print_dim_red(msg, end='\n'):
 	print_dim(Fore.RED + str(msg) + Fore.RESET, end=end)	
 
 def print_dim(msg, end='\n'):
-	print(Style.DIM + str(msg) + Style.RESET_ALL, end=end)
-
-def download_with_progress(url, output_path, expected_size, verbose_output, size_tolerance):
-	class download_progress_bar(tqdm):
-		def __init__(self, expected_size=None, dynamic_ncols=True):
-			r_bar = '| {n_fmt}{unit}/{total_fmt}{unit} [{elapsed}<{remaining}, {rate_fmt}{postfix}]'
-			format = '{l_bar}{bar}' + r_bar
-
-			tqdm.__init__(
-				self, total=expected_size, unit='B', unit_divisor=1024, unit_scale=True, miniters=1,
-				dynamic_ncols=dynamic_ncols, bar_format=format
-			)
-
-		def update_to(self, b=1, bsize=1, tsize=None):
-			if tsize is not None:
-				self.total = tsize
-			self.update(b * bsize - self.n)
-			
-
-	with download_progress_bar(expected_size=expected_size) as t:
-		try:
-			urllib.request.urlretrieve(url, filename=output_path, reporthook=t.update_to)
-			file_size = os.path.getsize(output_path)
-			if abs(file_size - expected_size) > size_tolerance:
-				t.update_to(bsize=0, tsize=expected_size)
-				if verbose_output:
-					print_dim_red(
-						f'Size mismatch: Expected {expected_size} bytes but got {file_size}. '
-			   			f'Size difference: {size_to_string(abs(file_size - expected_size))}.\n'
-						f'You might want to increase FILE_SIZE_MISMATCH_TOLERANCE in config.py'
-					)
-				raise Exception(f'Failed to download file at {url}.{"" if verbose_output else " Enable verbose output for more details."}')
-			
-			t.update_to(bsize=file_size, tsize=file_size)
-			t.close()
-
-			if file_size != expected_size and verbose_output:
-				print_dim_red(
-					f'Size mismatch within tolerance: Expected {expected_size} bytes but got {file_size}. '
-					f'Size difference: {size_to_string(abs(file_size - expected_size))}.'
-				)
-		except:
-			try:
-				os.remove(output_path)
-			except OSError:
-				pass
-			
-			raise
+	tqdm.write(Style.DIM + str(msg) + Style.RESET_ALL, end=end)
 
 def is_debug() -> bool:
     """Return if the debugger is currently active"""
@@ -211,6 +159,69 @@ class percentage_tqdm(tqdm):
 			dynamic_ncols=dynamic_ncols
 		)
 
+class aggregate_progress_bar(tqdm):
+	"""Thread safe byte progress bar shared by several concurrent downloads."""
+	def __init__(self, total=None, dynamic_ncols=True):
+		r_bar = '| {n_fmt}{unit}/{total_fmt}{unit} [{elapsed}<{remaining}, {rate_fmt}{postfix}]'
+
+		tqdm.__init__(
+			self, total=total, unit='B', unit_divisor=1024, unit_scale=True, dynamic_ncols=dynamic_ncols,
+			bar_format='{l_bar}{bar}' + r_bar
+		)
+		self.add_lock = threading.Lock()
+
+	def add(self, n):
+		with self.add_lock:
+			self.update(n)
+
+	def add_total(self, n):
+		with self.add_lock:
+			self.total += n
+			self.refresh()
+
+class prefetching_map:
+	"""
+	Maps fn over items using an executor and yields the results in order, keeping at most max_pending calls ahead.
+	Items for which run_inline returns True are mapped on the calling thread instead.
+	on_fill is called with the number of pending calls whenever more calls are started.
+	"""
+	def __init__(self, executor, fn, items, max_pending, run_inline=None, on_fill=None):
+		self.executor = executor
+		self.fn = fn
+		self.items = iter(items)
+		self.max_pending = max_pending
+		self.run_inline = run_inline
+		self.on_fill = on_fill
+		self.pending = collections.deque()
+		self._fill()
+
+	def _fill(self):
+		while len(self.pending) < self.max_pending:
+			try:
+				item = next(self.items)
+			except StopIteration:
+				return
+
+			if self.run_inline and self.run_inline(item):
+				future = concurrent.futures.Future()
+				future.set_result(item)
+			else:
+				future = self.executor.submit(self.fn, item)
+			self.pending.append(future)
+
+		if self.on_fill:
+			self.on_fill(len(self.pending))
+
+	def __iter__(self): return self
+
+	def __next__(self):
+		if not self.pending:
+			raise StopIteration()
+
+		future = self.pending.popleft()
+		self._fill()
+		return future.result()
+
 class chain:
 	def __init__(self, *iters):
 		self.iter_list = list(iters)
@@ -237,23 +248,100 @@ class chain:
 		raise StopIteration
 	
 class persistent_dict():
+	"""
+	Small JSON file of values that is safe to share between threads and processes.
+	Writes go to a temporary file that replaces the original, under a lock file so concurrent stores don't lose updates.
+	Loads are served from memory until the file changes.
+	"""
 	def __init__(self, path):
 		self.path = path
+		self.lock = threading.Lock()
+		self.data = {}
+		self.file_stat = None
 	
 	def load(self, key):
-		try:
-			with open(self.path, 'r') as file:
-				return json.load(file).get(key)
-		except (FileNotFoundError, json.decoder.JSONDecodeError):
-			return None
+		with self.lock:
+			self._refresh()
+			return self.data.get(key)
 
 	def store(self, key, value):
+		with self.lock, file_lock(self.path + '.lock'):
+			# Another process might have changed other keys since the last load.
+			self._refresh()
+			self._write(key, value)
+
+	def replace(self, key, expected_value, value):
+		"""Store the value only if the key still has the expected value, return if it was stored."""
+		with self.lock, file_lock(self.path + '.lock'):
+			self._refresh()
+			if self.data.get(key) != expected_value:
+				return False
+
+			self._write(key, value)
+			return True
+
+	def _write(self, key, value):
+		data = dict(self.data)
+		data[key] = value
+
+		tmp_path = f'{self.path}.{os.getpid()}.tmp'
+		with open(tmp_path, 'w') as file:
+			json.dump(data, file, indent=4)
+			file.flush()
+			os.fsync(file.fileno())
+		os.replace(tmp_path, self.path)
+
+		self.data = data
+		self.file_stat = _file_stat(self.path)
+
+	def _refresh(self):
+		file_stat = _file_stat(self.path)
+		if file_stat == self.file_stat:
+			return
+
 		try:
 			with open(self.path, 'r') as file:
-				data = json.load(file)
+				self.data = json.load(file)
 		except (FileNotFoundError, json.decoder.JSONDecodeError):
-			data = {}
-		
-		data[key] = value
-		with open(self.path, 'w') as file:
-			json.dump(data, file, indent=4)
\ No newline at end of file
+			self.data = {}
+		self.file_stat = file_stat
+
+def _file_stat(path):
+	try:
+		stat = os.stat(path)
+	except FileNotFoundError:
+		return None
+	return (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+
+class file_lock():
+	"""Exclusive lock between processes, held on a separate lock file since the locked file itself gets replaced."""
+	def __init__(self, path):
+		self.path = path
+		self.file = None
+
+	def __enter__(self):
+		self.file = open(self.path, 'a+')
+		if sys.platform == 'win32':
+			import msvcrt
+			self.file.seek(0)
+			while True:
+				try:
+					msvcrt.locking(self.file.fileno(), msvcrt.LK_LOCK, 1)
+					break
+				except OSError:
+					# LK_LOCK gives up after 10 seconds, keep waiting for the other process.
+					pass
+		else:
+			import fcntl
+			fcntl.flock(self.file.fileno(), fcntl.LOCK_EX)
+		return self
+
+	def __exit__(self, *exc_info):
+		if sys.platform == 'win32':
+			import msvcrt
+			self.file.seek(0)
+			msvcrt.locking(self.file.fileno(), msvcrt.LK_UNLCK, 1)
+		else:
+			import fcntl
+			fcntl.flock(self.file.fileno(), fcntl.LOCK_UN)
+		self.file.close()
@@ -1,14 +1,26 @@
+import time
 from urllib.parse import parse_qs, urlparse
 
 import requests
+from requests.adapters import HTTPAdapter
 
+import lib.metrics as metrics
 import lib.oauth_server as oauth_server
+import lib.rate_limiter as rate_limiter
+import lib.token_manager as token_manager
 import lib.urls as urls
 import lib.utils as utils
 
+# Seconds to wait for Zoom to connect or send data before retrying the request.
+REQUEST_TIMEOUT = 60
+
 
 class zoom_client:
-	def __init__(self, credentials, refresh_tokens_path, use_oauth_server, oauth_port, oauth_timeout, verbose_output, PAGE_SIZE: int = 300):
+	def __init__(
+		self, credentials, refresh_tokens_path, use_oauth_server, oauth_port, oauth_timeout, verbose_output,
+		rate_limits, max_retries, connection_pool_size, response_cache=None, cache_namespace='', session=None,
+		run_metrics=None, PAGE_SIZE: int = 300
+	):
 		if type(credentials).__name__ == "server_to_server":
 			self.account_id = credentials.ACCOUNT_ID
 			self.client_id = credentials.CLIENT_ID
@@ -27,7 +39,14 @@ class zoom_client:
 		self.oauth_timeout = oauth_timeout
 		self.verbose_output = verbose_output
 		self.PAGE_SIZE = PAGE_SIZE
-		self.cached_token = None
+		self.rate_limiter = rate_limiter.rate_limiter(rate_limits)
+		self.max_retries = max_retries
+		# Clients of different accounts can share one session, and one response cache under different namespaces.
+		self.session = session or _create_session(connection_pool_size)
+		self.response_cache = response_cache
+		self.cache_namespace = cache_namespace
+		self.tokens = token_manager.token_manager(self._fetch_token)
+		self.metrics = run_metrics or metrics.metrics()
 
 	def credentials_description(self):
 		if self.is_oauth and self.use_oauth_server:
@@ -38,15 +57,74 @@ class zoom_client:
 			return 'Server to Server Credentials'
 	
 	def get(self, url):
-		return self._get_with_token(lambda t: requests.get(url=url, headers=self._get_headers(t))).json()
+		cached_response = self._get_cached(url)
+		if cached_response is not None:
+			return cached_response
+
+		response = self._get(url)
+		self._put_cached(url, response)
+
+		return response
+
+	def _get_cached(self, url):
+		return self.response_cache.get(self.cache_namespace + url) if self.response_cache else None
+
+	def _put_cached(self, url, response):
+		if self.response_cache:
+			self.response_cache.put(self.cache_namespace + url, urls.cache_category(url), response)
+
+	def _get(self, url):
+		return self._get_with_token(lambda t: self._api_get(url, t)).json()
+
+	def _api_get(self, url, token):
+		category = urls.rate_limit_category(url)
+		endpoint = urls.endpoint_name(url)
+
+		for attempt in range(self.max_retries + 1):
+			self.metrics.observe('api_rate_limit_wait_seconds', self.rate_limiter.acquire(category), endpoint=endpoint)
+			start_time = time.monotonic()
+			try:
+				response = self.session.get(url=url, headers=self._get_headers(token), timeout=REQUEST_TIMEOUT)
+			except (requests.ConnectionError, requests.Timeout) as error:
+				timed_out = isinstance(error, requests.Timeout)
+				self._record_request(endpoint, start_time, 'timeout' if timed_out else 'connection_error')
+				if attempt == self.max_retries:
+					raise
+				response = None
+			else:
+				self._record_request(endpoint, start_time, response.status_code)
+				self.rate_limiter.update(category, response.headers)
+				if response.status_code != 429 and response.status_code < 500 or attempt == self.max_retries:
+					return response
+
+			delay = rate_limiter.retry_delay(response, attempt)
+			self.rate_limiter.record_retry(throttled=response is not None and response.status_code == 429)
+			if response is not None:
+				reason = f'HTTP {response.status_code}'
+			else:
+				reason = 'Timeout' if timed_out else 'Connection error'
+			self.metrics.increment('api_retries_total', endpoint=endpoint, reason=reason)
+			if delay > 60:
+				utils.print_bright_red(f'{reason} from Zoom API, the rate limit was reached. Waiting {delay / 60:.0f} minutes.')
+			elif self.verbose_output:
+				utils.print_dim_red(f'{reason} from Zoom API, retrying in {delay:.1f} seconds.')
+
+			if response is not None and response.status_code == 429:
+				self.rate_limiter.pause(category, delay)
+			else:
+				time.sleep(delay)
+
+	def _record_request(self, endpoint, start_time, status):
+		self.metrics.observe('api_request_seconds', time.monotonic() - start_time, endpoint=endpoint)
+		self.metrics.increment('api_requests_total', endpoint=endpoint, status=status)
 
 	def _get_with_token(self, get):
-		if self.cached_token:
-			response = get(self.cached_token)
-		
-		if not self.cached_token or response.status_code == 401:
-			self.cached_token = self._fetch_token()
-			response = get(self.cached_token)
+		token = self.tokens.get()
+		response = get(token)
+
+		if response.status_code == 401:
+			self.tokens.invalidate(token)
+			response = get(self.tokens.get())
 
 		if not response.ok:
 			raise Exception(f'{response.status_code} {response.text}')
@@ -54,7 +132,7 @@ class zoom_client:
 		return response
 
 	def prefetch_token(self):
-		self._fetch_token()
+		self.tokens.get()
 
 	def _fetch_token(self):
 		used_refresh_token = False
@@ -80,16 +158,20 @@ class zoom_client:
 				'grant_type': 'account_credentials',
 				'account_id': self.account_id
 			}
-		response = requests.post(
-			urls.token(), auth=(self.client_id, self.client_secret), data=data
-		).json()
+		with self.metrics.timer('api_request_seconds', endpoint='token'):
+			response = self.session.post(
+				urls.token(), auth=(self.client_id, self.client_secret), data=data, timeout=REQUEST_TIMEOUT
+			).json()
+		self.metrics.increment('token_fetches_total', grant_type=data['grant_type'], success='access_token' in response)
 
 		if self.verbose_output:
 			utils.print_dim(f'Fetching access token with grant_type: {data["grant_type"]}.')
 
 		if 'access_token' not in response:
 			if used_refresh_token:
-				self.refresh_tokens.store(self.auth_identifier, None)
+				# Another process sharing the refresh tokens might have used this one and stored its replacement,
+				# which is kept and tried next.
+				self.refresh_tokens.replace(self.auth_identifier, refresh_token, None)
 				return self._fetch_token()
 			raise Exception(f'Unable to fetch access token: {response["reason"]} - verify your credentials.')
 
@@ -100,7 +182,7 @@ class zoom_client:
 			utils.print_dim(f'Got token with scope: {response["scope"]}.')
 			utils.print_dim('')
 			
-		return response['access_token']  
+		return response['access_token'], response.get('expires_in')
 	
 	def _get_headers(self, token):
 		return {
@@ -113,7 +195,18 @@ class zoom_client:
 			def __init__(self, client, url):
 				self.url = utils.add_url_params(url, {'page_size': client.PAGE_SIZE})
 				self.client = client
-				self.page = client.get(self.url)
+				# Pages fetched from the API, cached pages don't count.
+				self.request_count = 0
+
+				# Pages are cached together since page tokens expire and a cached page might point to a stale one.
+				self.cached_pages = client._get_cached(self.url)
+				if self.cached_pages is not None:
+					self.page_count = len(self.cached_pages)
+					return
+
+				self.pages = []
+				self.page = client._get(self.url)
+				self.request_count += 1
 				self.page_count = self.page['page_count'] or 1
 			
 			def __iter__(self): return self
@@ -121,32 +214,67 @@ class zoom_client:
 			def __len__(self): return self.page_count
 
 			def __next__(self):
+				if self.cached_pages is not None:
+					if not self.cached_pages:
+						raise StopIteration()
+					return self.cached_pages.pop(0)
+
 				page = self.page
 				if not page and self.page_token:
-					page = self.client.get(utils.add_url_params(self.url, {'next_page_token': self.page_token}))
+					page = self.client._get(utils.add_url_params(self.url, {'next_page_token': self.page_token}))
+					self.request_count += 1
 
 				if not page:
+					if self.pages is not None:
+						self.client._put_cached(self.url, self.pages)
+						self.pages = None
 					raise StopIteration()
 
 				self.page, self.page_token = None, page['next_page_token']
+				self.pages.append(page)
 				return page
 			
 		return __paginate_iter(self, url)
 	
 	def do_with_token(self, do):
-		def do_as_get(token):
-			test_response = requests.get(urls.test(), headers=self._get_headers(token))
-			if test_response.ok:
-				try:
-					do(token)
-				except:
-					test_response = requests.get(urls.test(), headers=self._get_headers(token))
-					if test_response.ok:
-						raise
-
-			return test_response
-			
-		self._get_with_token(lambda t: do_as_get(t))
+		token = self.tokens.get()
+		try:
+			return do(token)
+		except requests.HTTPError as error:
+			# Only retry with a new token if Zoom rejected the one we had.
+			if error.response is None or error.response.status_code != 401:
+				raise
+
+		self.tokens.invalidate(token)
+		return do(self.tokens.get())
+
+	def connection_statistics(self):
+		connection_count, request_count = 0, 0
+
+		for adapter in set(self.session.adapters.values()):
+			pools = adapter.poolmanager.pools
+			for key in pools.keys():
+				pool = pools[key]
+				connection_count += pool.num_connections
+				request_count += pool.num_requests
+
+		return connection_count, request_count
+
+	def connection_statistics_description(self):
+		connection_count, request_count = self.connection_statistics()
+		return (
+			f'HTTP requests: {request_count} over {connection_count} connections '
+			f'({max(0, request_count - connection_count)} reused connections).'
+		)
+
+def _create_session(pool_size):
+	# A single session keeps connections to Zoom alive between requests and threads instead of reconnecting every time.
+	session = requests.Session()
+	adapter = HTTPAdapter(pool_maxsize=pool_size)
+	session.mount('https://', adapter)
+	session.mount('http://', adapter)
+
+	return session
 
 def _get_auth_code(auth_identifier, client_id, use_oauth_server, port, timeout):
 	utils.print_bright_blue('')
@@ -1,28 +1,104 @@
 import argparse
+import concurrent.futures
 import datetime
-import math
+import itertools
 import os
+import threading
+import time
 import traceback
 from calendar import monthrange
+from dataclasses import dataclass, field
 from types import ModuleType
 
 import colorama
 from colorama import Fore, Style
 
+import lib.downloader as downloader
+import lib.plan as plan
+import lib.scheduler as scheduler
 import lib.urls as urls
 import lib.utils as utils
+from lib.bandwidth_limiter import bandwidth_limiter
+from lib.date_windows import MAX_WINDOW_DAYS, date_windows, split_window
+from lib.disk_space import disk_space_ledger
+from lib.journal import journal
+from lib.manifest import manifest
+from lib.metrics import metrics
+from lib.response_cache import response_cache
 from lib.zoom_client import zoom_client
 
 colorama.init()
 
+@dataclass
+class account_state:
+	"""What a run keeps for each Zoom account it downloads from."""
+	name: str; client: zoom_client; output_path: str; users: list; topics: list; file_types: list
+	manifest: manifest = None; journal: journal = None; saved_meeting_lookups: int = 0; other_shards_count: int = 0
+	user_created_dates: dict = field(default_factory=dict); window_requests: int = 0; fixed_window_requests: int = 0
+
+@dataclass
+class download_job:
+	url: str; file_id: str; file_path: str; file_name: str; file_size: int
+	file_type: str; user_email: str; topic: str; recording_start: str; account: account_state
+
+job_plan = None
+download_executor = None
+download_bandwidth = None
+disk_space = None
+# Set when a download fails or the run is interrupted, stopping the downloads of all accounts.
+cancel_event = threading.Event()
+run_metrics = metrics()
+
 def get_parser():
 	parser = argparse.ArgumentParser(description="Zoom Batch Downloader - See the README.")
 	parser.add_argument(
 		'--config', '-c', nargs='+',
 		help='List of configuration files. Later configuration files override earlier ones on a value by value basis.'
 	)
+	parser.add_argument(
+		'--verify', action='store_true',
+		help='Check the downloads manifest against the files on disk before downloading, forgetting missing or changed files.'
+	)
+	parser.add_argument(
+		'--verify-archive', action='store_true',
+		help='Hash the files in the downloads manifest again and compare them with their checksums, then exit. '
+		'Missing or changed files are forgotten so the next run downloads them again.'
+	)
+	parser.add_argument(
+		'--clear-cache', action='store_true',
+		help='Clear the cached Zoom API responses before running, so all data is fetched again.'
+	)
+	parser.add_argument(
+		'--plan', metavar='PLAN_PATH',
+		help='Scan without downloading and write the files that would be downloaded to a JSON Lines file '
+		'(or CSV if the path ends with .csv), along with size totals.'
+	)
+	parser.add_argument(
+		'--from-plan', metavar='PLAN_PATH',
+		help='Download the files listed in a plan file written by --plan instead of scanning for them.'
+	)
+	parser.add_argument(
+		'--shard', metavar='INDEX/COUNT', type=parse_shard,
+		help='Only handle the files in the given shard out of COUNT shards (e.g. 2/4), so several processes or machines '
+		'can download disjoint parts of the same recordings into a shared output folder.'
+	)
+	parser.add_argument(
+		'--timings', action='store_true',
+		help='Print a breakdown of where the time of the run went when it ends.'
+	)
 	return parser
 
+def parse_shard(value):
+	try:
+		index, count = (int(part) for part in value.split('/'))
+	except ValueError:
+		raise argparse.ArgumentTypeError(f'Invalid shard "{value}", expected INDEX/COUNT (e.g. 2/4).')
+
+	if not 1 <= index <= count:
+		raise argparse.ArgumentTypeError(f'Invalid shard "{value}", INDEX must be between 1 and COUNT.')
+
+	return index, count
+
 def setup_config():
 	args = get_parser().parse_args()
 	configs = args.config
@@ -36,19 +112,84 @@ def setup_config():
 			utils.print_bright_red(f'Error: {error}')
 			exit(1)
 
+	return args
 
-def create_zoom_client():
+
+def create_zoom_client(credentials, cache=None, cache_namespace='', session=None):
 	return zoom_client(
-		credentials=CONFIG.CREDENTIALS,
+		credentials=credentials,
 		refresh_tokens_path=CONFIG.REFRESH_TOKENS_PATH,
 		use_oauth_server=CONFIG.REFRESH_TOKENS_PATH,
 		oauth_port=CONFIG.OAUTH_PORT,
 		oauth_timeout=CONFIG.USER_INPUT_TIMEOUT,
-		verbose_output=CONFIG.VERBOSE_OUTPUT
+		verbose_output=CONFIG.VERBOSE_OUTPUT,
+		rate_limits=CONFIG.API_RATE_LIMITS,
+		max_retries=CONFIG.API_MAX_RETRIES,
+		connection_pool_size=(
+			CONFIG.CONNECTION_POOL_SIZE or CONFIG.MAX_PARALLEL_SCANS + CONFIG.MAX_PARALLEL_DOWNLOADS * CONFIG.DOWNLOAD_SEGMENTS
+		),
+		response_cache=cache,
+		cache_namespace=cache_namespace,
+		session=session,
+		run_metrics=run_metrics
 	)
 
+def create_accounts(cache):
+	"""Return the accounts to download from, CREDENTIALS and OUTPUT_PATH make up a single account if ACCOUNTS is empty."""
+	if not CONFIG.ACCOUNTS:
+		client = create_zoom_client(CONFIG.CREDENTIALS, cache)
+		return [
+			account_state(
+				None, client, utils.prepend_path_on_windows(CONFIG.OUTPUT_PATH), CONFIG.USERS, CONFIG.TOPICS,
+				CONFIG.RECORDING_FILE_TYPES
+			)
+		]
+
+	names = [config_account.NAME for config_account in CONFIG.ACCOUNTS]
+	if len(set(names)) != len(names) or not all(names):
+		raise Exception('Each account in ACCOUNTS needs a unique NAME.')
+
+	# Refresh tokens are stored by auth_identifier, accounts sharing one would keep replacing each other's token.
+	auth_identifiers = [
+		config_account.CREDENTIALS.auth_identifier for config_account in CONFIG.ACCOUNTS
+		if type(config_account.CREDENTIALS).__name__ == "oauth"
+	]
+	if len(set(auth_identifiers)) != len(auth_identifiers):
+		raise Exception('Each account in ACCOUNTS with OAuth credentials needs a unique auth_identifier.')
+
+	accounts = []
+	for config_account in CONFIG.ACCOUNTS:
+		# All the accounts share the same connections.
+		session = accounts[0].client.session if accounts else None
+		client = create_zoom_client(config_account.CREDENTIALS, cache, f'{config_account.NAME}:', session)
+
+		accounts.append(account_state(
+			config_account.NAME, client, utils.prepend_path_on_windows(config_account.OUTPUT_PATH),
+			CONFIG.USERS if config_account.USERS is None else config_account.USERS,
+			CONFIG.TOPICS if config_account.TOPICS is None else config_account.TOPICS,
+			CONFIG.RECORDING_FILE_TYPES if config_account.RECORDING_FILE_TYPES is None else config_account.RECORDING_FILE_TYPES
+		))
+
+	return accounts
+
+def get_account_path(path, account):
+	"""Return the path of a per account file, named after the account when there are several."""
+	if not account.name:
+		return path
+
+	root, ext = os.path.splitext(path)
+	return f'{root}.{utils.slugify(account.name)}{ext}'
+
+def get_shard_path(path):
+	"""Return the path of a per process file, named after the shard when running one."""
+	if not args.shard:
+		return path
+
+	root, ext = os.path.splitext(path)
+	return f'{root}.shard-{args.shard[0]}-of-{args.shard[1]}{ext}'
+
 if __name__ == '__main__':
-	setup_config()
+	args = setup_config()
 	try:
 		import config as CONFIG
 	except ImportError:
@@ -58,36 +199,260 @@ if __name__ == '__main__':
 		)
 		exit(1)
 
-	client = create_zoom_client()
-
 def main():
-	CONFIG.OUTPUT_PATH = utils.prepend_path_on_windows(CONFIG.OUTPUT_PATH)
+	cache = (
+		response_cache(CONFIG.RESPONSE_CACHE_PATH, CONFIG.RESPONSE_CACHE_MAX_SIZE, CONFIG.RESPONSE_CACHE_TTLS)
+		if CONFIG.RESPONSE_CACHE_PATH else None
+	)
+	accounts = create_accounts(cache)
+	run_metrics.set('last_run_success', 0)
+	run_metrics.add_collector(lambda: collect_metrics(accounts, cache))
 
-	utils.print_bright(f'Using {client.credentials_description()}.')
-	print_filter_warnings()
+	for account in accounts:
+		account_str = f'account {account.name} with ' if account.name else ''
+		utils.print_bright(f'Using {account_str}{account.client.credentials_description()}.')
+		print_filter_warnings(account)
+
+	if args.shard:
+		utils.print_bright(f'Handling shard {args.shard[0]} out of {args.shard[1]}.')
+		print()
 
 	from_date, to_date = evaluate_dates()
-	file_count, total_size, skipped_count = download_recordings(get_users(), from_date, to_date)
+	scheduler.check_order(CONFIG.DOWNLOAD_ORDER)
+
+	if CONFIG.INCREMENTAL_SYNC and not CONFIG.MANIFEST_PATH:
+		raise Exception('INCREMENTAL_SYNC requires MANIFEST_PATH to be set.')
+
+	if args.verify_archive and not CONFIG.MANIFEST_PATH:
+		raise Exception('--verify-archive requires MANIFEST_PATH to be set.')
+
+	if cache and args.clear_cache:
+		cache.clear()
+
+	if CONFIG.MANIFEST_PATH:
+		for account in accounts:
+			account.manifest = manifest(get_account_path(CONFIG.MANIFEST_PATH, account), account.output_path)
+			if args.verify:
+				verify_manifest(account)
+
+	if args.verify_archive:
+		try:
+			for account in accounts:
+				verify_archive(account)
+		finally:
+			for account in accounts:
+				account.manifest.close()
+		return
+
+	global job_plan
+	if args.plan:
+		job_plan = plan.plan_writer(args.plan)
+
+	if CONFIG.JOURNAL_PATH and not args.plan:
+		for account in accounts:
+			account.journal = journal(
+				get_shard_path(get_account_path(CONFIG.JOURNAL_PATH, account)), get_run_key(account, from_date)
+			)
+			if account.journal.resumed:
+				account_str = f' of account {account.name}' if account.name else ''
+				utils.print_bright(f'Continuing the interrupted run{account_str} from its journal.')
+				print()
+
+	global download_bandwidth
+	download_bandwidth = bandwidth_limiter(CONFIG.MAX_DOWNLOAD_SPEED, CONFIG.DOWNLOAD_SPEED_SCHEDULE)
+	if download_bandwidth.is_active() and not args.plan:
+		utils.print_bright(download_bandwidth.limit_description())
+		print()
+
+	global disk_space
+	disk_space = disk_space_ledger(CONFIG.MINIMUM_FREE_DISK, CONFIG.USER_INPUT_TIMEOUT)
+
+	global scan_executor, download_executor
+	scan_executor = concurrent.futures.ThreadPoolExecutor(max_workers=CONFIG.MAX_PARALLEL_SCANS)
+	# Accounts downloaded at the same time share the download workers, a single account downloads one by one without them.
+	if CONFIG.MAX_PARALLEL_DOWNLOADS > 1 or len(accounts) > 1:
+		download_executor = concurrent.futures.ThreadPoolExecutor(max_workers=max(1, CONFIG.MAX_PARALLEL_DOWNLOADS))
+	try:
+		if args.from_plan:
+			file_count, total_size, skipped_count = download_planned_recordings(args.from_plan, accounts)
+		else:
+			file_count, total_size, skipped_count = download_accounts_recordings(accounts, from_date, to_date)
+	finally:
+		scan_executor.shutdown(cancel_futures=True)
+		if download_executor:
+			download_executor.shutdown(cancel_futures=True)
+		for account in accounts:
+			if account.manifest:
+				account.manifest.close()
+			if account.journal:
+				account.journal.close()
+		if job_plan:
+			job_plan.close()
+
+	for account in accounts:
+		if account.journal:
+			account.journal.complete()
 
 	total_size_str = utils.size_to_string(total_size)
 
-	print(
-		f'{Style.BRIGHT}Downloaded {Fore.GREEN}{file_count}{Fore.RESET} files.',
-		f'Total size: {Fore.GREEN}{total_size_str}{Fore.RESET}.{Style.RESET_ALL}',
-		f'Skipped: {skipped_count} files.'
+	if job_plan:
+		job_plan.totals.print_summary()
+		print(
+			f'{Style.BRIGHT}Planned {Fore.GREEN}{file_count}{Fore.RESET} files to {args.plan}.',
+			f'Total size: {Fore.GREEN}{total_size_str}{Fore.RESET}.{Style.RESET_ALL}',
+			f'Skipped: {skipped_count} existing files.'
+		)
+	else:
+		print(
+			f'{Style.BRIGHT}Downloaded {Fore.GREEN}{file_count}{Fore.RESET} files.',
+			f'Total size: {Fore.GREEN}{total_size_str}{Fore.RESET}.{Style.RESET_ALL}',
+			f'Skipped: {skipped_count} files.'
+		)
+
+	other_shards_count = sum(account.other_shards_count for account in accounts)
+	if other_shards_count:
+		utils.print_dim(f'Left {other_shards_count} files to the other shards.')
+
+	saved_meeting_lookups = sum(account.saved_meeting_lookups for account in accounts)
+	if saved_meeting_lookups:
+		utils.print_dim(f'Saved {saved_meeting_lookups} API requests by using the listed recordings data.')
+
+	window_requests = sum(account.window_requests for account in accounts)
+	saved_window_requests = sum(account.fixed_window_requests for account in accounts) - window_requests
+	if saved_window_requests:
+		utils.print_dim(
+			f'Listed recordings with {window_requests} API requests, {abs(saved_window_requests)} '
+			f'{"fewer" if saved_window_requests > 0 else "more"} than with fixed {MAX_WINDOW_DAYS} day date windows.'
+		)
+
+	if CONFIG.VERBOSE_OUTPUT:
+		for account in accounts:
+			account_str = f'{account.name}: ' if account.name else ''
+			utils.print_dim(account_str + account.client.rate_limiter.statistics_description())
+		utils.print_dim(accounts[0].client.connection_statistics_description())
+		if not job_plan:
+			utils.print_dim(download_bandwidth.statistics_description())
+		if cache:
+			utils.print_dim(cache.statistics_description())
+
+	if args.timings:
+		print_timings()
+
+	run_metrics.set('last_run_success', 1)
+	run_metrics.set('last_run_success_timestamp_seconds', time.time())
+
+def collect_metrics(accounts, cache):
+	"""Record the statistics kept by the other parts of the run, before the metrics are exported."""
+	run_metrics.set('run_seconds', run_metrics.wall_clock_time())
+
+	for account in accounts:
+		labels = {'account': account.name} if account.name else {}
+		stats = account.client.rate_limiter.statistics()
+		run_metrics.set('api_rate_limited_responses', stats['throttled_responses'], **labels)
+		run_metrics.set('token_refreshes', account.client.tokens.refresh_count, **labels)
+		run_metrics.set('saved_meeting_lookups', account.saved_meeting_lookups, **labels)
+		run_metrics.set('window_requests', account.window_requests, **labels)
+		run_metrics.set('fixed_window_requests', account.fixed_window_requests, **labels)
+
+	if download_bandwidth:
+		run_metrics.set('download_speed_limit_wait_seconds', download_bandwidth.throttled_time)
+	if cache:
+		run_metrics.set('response_cache_hits', cache.hits)
+		run_metrics.set('response_cache_misses', cache.misses)
+
+def print_timings():
+	"""Print where the time of the run went, the times of parallel requests and downloads are summed."""
+	utils.print_bright(f'Timings (wall clock time: {run_metrics.wall_clock_time():.1f}s, the rest summed over threads):')
+
+	phases_str = ', '.join(
+		f'{phase} {run_metrics.summary("phase_seconds", phase=phase)[1]:.1f}s'
+		for phase in ('listing users', 'verifying manifest', 'verifying archive')
+		if run_metrics.summary('phase_seconds', phase=phase)[0]
 	)
+	if phases_str:
+		utils.print_dim(f'Phases: {phases_str}.')
+
+	request_count, request_time, _ = run_metrics.summary('api_request_seconds')
+	endpoints_str = ', '.join(
+		f'{endpoint} {run_metrics.summary("api_request_seconds", endpoint=endpoint)[1]:.1f}s'
+		f'/{run_metrics.summary("api_request_seconds", endpoint=endpoint)[0]}'
+		for endpoint in ('token', 'users', 'user_recordings', 'meeting_recordings')
+		if run_metrics.summary('api_request_seconds', endpoint=endpoint)[0]
+	)
+	utils.print_dim(
+		f'API requests: {request_count} taking {request_time:.1f}s ({endpoints_str or "none"}), '
+		f'retries: {run_metrics.counter("api_retries_total")}, '
+		f'waiting for the rate limit: {run_metrics.summary("api_rate_limit_wait_seconds")[1]:.1f}s.'
+	)
+
+	download_count, download_time, _ = run_metrics.summary('download_seconds')
+	download_speed = run_metrics.counter('downloaded_bytes_total') / download_time if download_time else 0
+	utils.print_dim(
+		f'Downloads: {download_count} taking {download_time:.1f}s ({utils.size_to_string(download_speed)}/s per download), '
+		f'waiting for the speed limit: {download_bandwidth.throttled_time if download_bandwidth else 0:.1f}s, '
+		f'waiting for disk space: {run_metrics.summary("disk_space_wait_seconds")[1]:.1f}s.'
+	)
+
+	queues_str = ', '.join(
+		f'{queue} {total / count:.1f} on average, {maximum} at most'
+		for queue in ('windows', 'meetings', 'downloads')
+		for count, total, maximum in [run_metrics.summary('queue_depth', queue=queue)]
+		if count
+	)
+	if queues_str:
+		utils.print_dim(f'Queue depths: {queues_str}.')
+	print()
+
+def get_run_key(account, from_date):
+	"""Return what identifies a run, an interrupted run is only continued by a run with the same key."""
+	# The configured end date is used rather than the date it resolves to, which is today when it's not set,
+	# so a run interrupted after midnight is still continued.
+	end_date = (CONFIG.END_YEAR, CONFIG.END_MONTH, CONFIG.END_DAY)
+
+	return {
+		'users': account.users, 'from_date': from_date, 'end_date': end_date, 'topics': account.topics,
+		'file_types': account.file_types, 'participant_audio': CONFIG.INCLUDE_PARTICIPANT_AUDIO,
+		'output_path': account.output_path, 'group_by': CONFIG.GROUP_BY, 'incremental': CONFIG.INCREMENTAL_SYNC,
+		'shard': args.shard, 'from_plan': args.from_plan
+	}
+
+def verify_manifest(account):
+	utils.print_bright(f'Verifying {account.manifest.count()} files in the downloads manifest of {account.output_path}.')
+	with run_metrics.timer('phase_seconds', phase='verifying manifest'):
+		removed_count = account.manifest.verify(account.output_path)
+
+	if removed_count:
+		utils.print_bright_red(f'{removed_count} files are missing or changed on disk and will be downloaded again.')
+	print()
+
+def verify_archive(account):
+	utils.print_bright(f'Verifying the checksums of {account.manifest.count()} files in {account.output_path}:')
 
-def print_filter_warnings():
+	workers = os.cpu_count() or 1
+	with run_metrics.timer('phase_seconds', phase='verifying archive'):
+		with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+			with utils.aggregate_progress_bar(total=account.manifest.total_size()) as progress_bar:
+				checked_count, removed_count = account.manifest.verify_checksums(
+					account.output_path, executor, workers, progress_bar.add
+				)
+
+	if removed_count:
+		utils.print_bright_red(f'{removed_count} files are missing or changed on disk and will be downloaded again.')
+	else:
+		utils.print_bright(f'All {checked_count} files match their checksums.')
+	print()
+
+def print_filter_warnings(account):
 	did_print = False
 
-	if CONFIG.TOPICS:
-		utils.print_bright(f'Topics filter is active {CONFIG.TOPICS}')
+	if account.topics:
+		utils.print_bright(f'Topics filter is active {account.topics}')
 		did_print = True
-	if CONFIG.USERS:
-		utils.print_bright(f'Users filter is active {CONFIG.USERS}')
+	if account.users:
+		utils.print_bright(f'Users filter is active {account.users}')
 		did_print = True
-	if CONFIG.RECORDING_FILE_TYPES:
-		utils.print_bright(f'Recording file types filter is active {CONFIG.RECORDING_FILE_TYPES}')
+	if account.file_types:
+		utils.print_bright(f'Recording file types filter is active {account.file_types}')
 		did_print = True
 		
 	if did_print:
@@ -109,16 +474,57 @@ def evaluate_dates():
 
 	return from_date, to_date
 
-def get_users():
-	if CONFIG.USERS:
-		return [(email, '') for email in CONFIG.USERS]
+def download_accounts_recordings(accounts, from_date, to_date):
+	if len(accounts) == 1:
+		return download_account_recordings(accounts[0], from_date, to_date)
+
+	# Accounts that need to be authorized ask for it one by one, before any of them starts.
+	for account in accounts:
+		account.client.prefetch_token()
+
+	with concurrent.futures.ThreadPoolExecutor(max_workers=len(accounts)) as executor:
+		futures = [executor.submit(download_account_recordings, account, from_date, to_date) for account in accounts]
+		try:
+			concurrent.futures.wait(futures, return_when=concurrent.futures.FIRST_EXCEPTION)
+		finally:
+			# A failed account stops the others, as a failed download stops a single account.
+			if not all(future.done() and not future.exception() for future in futures):
+				cancel_event.set()
+
+	errors = [future.exception() for future in futures if future.exception()]
+	if errors:
+		# The other accounts fail on being cancelled, the error that caused it is the interesting one.
+		raise next((error for error in errors if not isinstance(error, InterruptedError)), errors[0])
+
+	results = [future.result() for future in futures]
+	return tuple(sum(values) for values in zip(*results))
+
+def download_account_recordings(account, from_date, to_date):
+	return download_recordings(account, get_users(account), from_date, to_date)
+
+def get_users(account):
+	if account.users:
+		return [(email, '') for email in account.users]
+
+	if account.journal and account.journal.users is not None:
+		account.user_created_dates = account.journal.user_created_dates
+		return account.journal.users
 
-	utils.print_bright('Scanning for users:')
+	account_str = f' of account {account.name}' if account.name else ''
+	utils.print_bright(f'Scanning for users{account_str}:')
 	
 	users = []
-	pages = utils.chain(client.paginate(urls.active_users()), client.paginate(urls.inactive_users()))
-	for page in utils.percentage_tqdm(pages):
-			users.extend([(user['email'], get_user_name(user)) for user in page['users']]),
+	client = account.client
+	with run_metrics.timer('phase_seconds', phase='listing users'):
+		pages = utils.chain(client.paginate(urls.active_users()), client.paginate(urls.inactive_users()))
+		for page in utils.percentage_tqdm(pages):
+				users.extend([(user['email'], get_user_name(user)) for user in page['users']]),
+				account.user_created_dates.update(
+					(user['email'], user.get('user_created_at') or user.get('created_at')) for user in page['users']
+				)
+
+	if account.journal:
+		account.journal.add_users(users, account.user_created_dates)
 
 	print()
 	return users
@@ -132,19 +538,24 @@ def get_user_name(user_data):
 	else:
 		return first_name or last_name
 	
-def download_recordings(users, from_date, to_date):
+def download_recordings(account, users, from_date, to_date):
 	file_count, total_size, skipped_count = 0, 0, 0
 
-	for user_email, user_name in users:
-		user_description = get_user_description(user_email, user_name)
+	if account.journal:
+		done_users = [user for user in users if account.journal.is_user_done(user[0])]
+		if done_users:
+			utils.print_dim(f'Skipping {len(done_users)} users that were done before the interruption.')
+			print()
+			users = [user for user in users if not account.journal.is_user_done(user[0])]
+
+	if CONFIG.DOWNLOAD_ORDER != 'listed' and not job_plan:
+		return download_ordered_recordings(account, users, from_date, to_date)
 
-		utils.print_bright(
-			f'Downloading recordings from user {user_description} - Starting at {date_to_str(from_date)} '
-			f'and up to {date_to_str(to_date)} (inclusive).'
+	for user_email, meetings in scan_users_meetings(account, users, from_date, to_date, 'Downloading'):
+		user_file_count, user_total_size, user_skipped_count = download_recordings_from_meetings(
+			account, meetings, user_email
 		)
-	
-		meetings = get_meetings(get_meeting_uuids(user_email, from_date, to_date))
-		user_file_count, user_total_size, user_skipped_count = download_recordings_from_meetings(meetings, user_email)
+		complete_user(account, user_email, from_date, to_date)
 
 		utils.print_bright('######################################################################')
 		print()
@@ -155,114 +566,442 @@ def download_recordings(users, from_date, to_date):
 	
 	return (file_count, total_size, skipped_count)
 
-def get_user_description(user_email, user_name):
-	return f'{user_email} ({user_name})' if (user_name) else user_email
+def download_ordered_recordings(account, users, from_date, to_date):
+	"""Scan all the users before downloading, so their files can be downloaded in the configured order."""
+	users_meetings = scan_users_meetings(account, users, from_date, to_date, 'Scanning')
+	file_count, total_size, skipped_count = process_jobs(
+		job for user_email, meetings in users_meetings for meeting in meetings
+		for job in get_meeting_download_jobs(account, meeting, user_email)
+	)
+
+	for user_email, _ in users:
+		complete_user(account, user_email, from_date, to_date)
+
+	utils.print_bright('######################################################################')
+	print()
+
+	return (file_count, total_size, skipped_count)
+
+def scan_users_meetings(account, users, from_date, to_date, action):
+	"""Yield each user's email along with their selected meetings, scanned as they are iterated."""
+	users_listed_meetings = scan_listed_meetings(account, [user_email for user_email, _ in users], from_date, to_date)
+
+	for (user_email, user_name), listed_meetings in zip(users, users_listed_meetings):
+		check_cancelled()
+		user_description = get_user_description(account, user_email, user_name)
+
+		utils.print_bright(
+			f'{action} recordings from user {user_description} - Starting at '
+			f'{date_to_str(get_user_scan_start_date(account, user_email, from_date))} and up to {date_to_str(to_date)} '
+			f'(inclusive).'
+		)
+	
+		meetings = scan_meetings(account, (meeting for meeting in listed_meetings if is_topic_selected(account, meeting)))
+		yield user_email, meetings
+
+def complete_user(account, user_email, from_date, to_date):
+	if CONFIG.INCREMENTAL_SYNC and not job_plan:
+		save_user_scanned_range(account, user_email, from_date, to_date)
+
+	if account.journal:
+		account.journal.add_done_user(user_email)
+
+def get_user_start_date(account, user_email, from_date):
+	"""Return the date to scan the user's recordings from, skipping what previous incremental runs already covered."""
+	if not CONFIG.INCREMENTAL_SYNC:
+		return from_date
+
+	scanned_range = account.manifest.get_scanned_range(user_email, args.shard)
+	if scanned_range is None or scanned_range[0] > from_date:
+		return from_date
+
+	# Cloud recordings can show up a while after the meeting ended, so the end of the last scan is scanned again.
+	return max(from_date, scanned_range[1] - datetime.timedelta(days=CONFIG.INCREMENTAL_OVERLAP_DAYS))
+
+def get_user_scan_start_date(account, user_email, from_date):
+	"""Return the date to scan the user's recordings from, there are no recordings before the user was created."""
+	start_date = get_user_start_date(account, user_email, from_date)
+	created_date = get_user_created_date(account, user_email)
+
+	return max(start_date, created_date) if created_date else start_date
+
+def get_user_created_date(account, user_email):
+	created_at = account.user_created_dates.get(user_email)
+	try:
+		return datetime.datetime.strptime(created_at[:10], '%Y-%m-%d')
+	except (TypeError, ValueError):
+		return None
+
+def save_user_scanned_range(account, user_email, from_date, to_date):
+	scanned_range = account.manifest.get_scanned_range(user_email, args.shard)
+
+	if scanned_range is not None and scanned_range[0] <= from_date <= scanned_range[1]:
+		account.manifest.set_scanned_range(user_email, scanned_range[0], max(scanned_range[1], to_date), args.shard)
+	else:
+		account.manifest.set_scanned_range(user_email, from_date, to_date, args.shard)
+
+def get_user_description(account, user_email, user_name):
+	user_description = f'{user_email} ({user_name})' if (user_name) else user_email
+	return f'{user_description} of account {account.name}' if account.name else user_description
 	
 def date_to_str(date):
 	return date.strftime('%d/%m/%Y')
 
-def get_meeting_uuids(user_email, start_date, end_date):
-	meeting_uuids = []
+def scan_listed_meetings(account, user_emails, from_date, to_date):
+	"""
+	Start listing the users' recorded meetings in the background, return a generator of each user's listed meetings.
+	The users must be consumed in order, the windows of the next users are listed while the current user is processed.
+	"""
+	users_windows = [
+		date_windows(
+			get_user_start_date(account, user_email, from_date), to_date, get_user_created_date(account, user_email)
+		)
+		for user_email in user_emails
+	]
+	window_listings = list_windows(
+		account,
+		((user_email, *window) for user_email, windows in zip(user_emails, users_windows) for window in windows)
+	)
 
-	local_start_date = start_date
-	delta = datetime.timedelta(days=29)
-	
-	utils.print_bright('Scanning for recorded meetings:')
-	estimated_iterations = math.ceil((end_date-start_date) / datetime.timedelta(days=30))
-	with utils.percentage_tqdm(total=estimated_iterations) as progress_bar:
-		while local_start_date <= end_date:
-			local_end_date = min(local_start_date + delta, end_date)
+	def listed_meetings(windows):
+		user_listings = itertools.islice(window_listings, len(windows))
+		for i, (window_meetings, request_count) in enumerate(user_listings):
+			# Windows listed from the journal or the response cache took no requests either way.
+			if request_count:
+				account.window_requests += request_count
+				account.fixed_window_requests += windows.fixed_request_count(
+					i, len(window_meetings), account.client.PAGE_SIZE
+				)
+			yield from reversed(window_meetings)
+
+	return (listed_meetings(windows) for windows in users_windows)
 
-			ids = []
-			for page in client.paginate(urls.user_recordings(user_email, local_start_date, local_end_date)):
-				ids.extend([meeting['uuid'] for meeting in page['meetings']])
+def list_windows(account, windows):
+	"""
+	List the meetings of the (user email, start date, end date) windows in the background, yield the meetings of each
+	window in order with the number of API requests it took. Windows needing several pages are split into smaller
+	windows as soon as the first page is fetched, and listed in parallel too.
+	"""
+	window_scans = utils.prefetching_map(
+		scan_executor, lambda window: (window, get_window_meetings(account, *window)), windows,
+		CONFIG.MAX_PARALLEL_SCANS, on_fill=lambda depth: run_metrics.observe('queue_depth', depth, queue='windows')
+	)
+
+	for (user_email, start_date, end_date), (meetings, sub_windows, request_count) in window_scans:
+		if sub_windows:
+			sub_listings = list(list_windows(account, ((user_email, *sub_window) for sub_window in sub_windows)))
+			# Zoom lists the newest meetings first.
+			meetings = [meeting for sub_meetings, _ in reversed(sub_listings) for meeting in sub_meetings]
+			request_count += sum(sub_request_count for _, sub_request_count in sub_listings)
+			if account.journal:
+				account.journal.add_window(user_email, start_date, end_date, meetings)
 
-			meeting_uuids.extend(reversed(ids))
-			local_start_date = local_end_date + datetime.timedelta(days=1)
-			progress_bar.update(1)
+		yield meetings, request_count
 
-	return meeting_uuids
+def get_window_meetings(account, user_email, start_date, end_date):
+	"""
+	Return the user's meetings in the window, or the smaller windows to list instead if it needs several pages, along
+	with the number of API requests it took.
+	"""
+	check_cancelled()
+	if account.journal:
+		meetings = account.journal.get_window(user_email, start_date, end_date)
+		if meetings is not None:
+			return meetings, None, 0
+
+	pages = account.client.paginate(urls.user_recordings(user_email, start_date, end_date))
+	if pages.request_count and len(pages) > 1 and start_date < end_date:
+		return None, split_window(start_date, end_date, len(pages)), pages.request_count
 
-def get_meetings(meeting_uuids):
 	meetings = []
+	for page in pages:
+		meetings.extend(page['meetings'])
 
-	if meeting_uuids:
-		utils.print_bright(f'Scanning for recordings:')
-		for meeting_uuid in utils.percentage_tqdm(meeting_uuids):
-			meetings.append(client.get(urls.meeting_recordings(meeting_uuid)))
+	if account.journal:
+		account.journal.add_window(user_email, start_date, end_date, meetings)
 
-	return meetings
+	return meetings, None, pages.request_count
 
-def download_recordings_from_meetings(meetings, user_email):
-	file_count, total_size, skipped_count = 0, 0, 0
+def is_topic_selected(account, meeting):
+	return not account.topics or meeting['topic'] in account.topics or utils.slugify(meeting['topic']) in account.topics
 
-	for meeting in meetings:
-		if CONFIG.TOPICS and meeting['topic'] not in CONFIG.TOPICS and utils.slugify(meeting['topic']) not in CONFIG.TOPICS:
-			continue
-		
-		recording_files = meeting.get('recording_files') or []
-		participant_audio_files = (meeting.get('participant_audio_files') or []) if CONFIG.INCLUDE_PARTICIPANT_AUDIO else []
-
-		for recording_file in recording_files + participant_audio_files:
-			if 'file_size' not in recording_file:
-				continue
-
-			if CONFIG.RECORDING_FILE_TYPES and recording_file['file_type'] not in CONFIG.RECORDING_FILE_TYPES:
-				continue
-
-			url = recording_file['download_url']
-			topic = utils.slugify(meeting['topic'])
-			ext = recording_file.get('file_extension') or os.path.splitext(recording_file['file_name'])[1]
-			recording_name = utils.slugify(f'{topic}__{recording_file["recording_start"]}')
-			file_id = recording_file['id']
-			file_name_suffix =  os.path.splitext(recording_file['file_name'])[0] + '__' if 'file_name' in recording_file else ''
-			recording_type_suffix =  recording_file['recording_type'] + '__' if 'recording_type' in recording_file else ''
-			file_name = utils.slugify(
-				f'{recording_name}__{recording_type_suffix}{file_name_suffix}{file_id[-8:]}'
-			) + '.' + ext
-			file_size = int(recording_file['file_size'])
-
-			if download_recording_file(url, user_email, file_name, file_size, topic, recording_name):
-				total_size += file_size
-				file_count += 1
+def scan_meetings(account, listed_meetings):
+	return utils.prefetching_map(
+		scan_executor, lambda meeting: get_meeting(account, meeting), listed_meetings, CONFIG.MAX_PARALLEL_SCANS * 2,
+		run_inline=lambda meeting: use_listed_meeting(account, meeting),
+		on_fill=lambda depth: run_metrics.observe('queue_depth', depth, queue='meetings')
+	)
+
+def get_meeting(account, listed_meeting):
+	check_cancelled()
+	if account.journal:
+		meeting = account.journal.get_meeting(listed_meeting['uuid'])
+		if meeting is not None:
+			return meeting
+
+	meeting = account.client.get(urls.meeting_recordings(listed_meeting['uuid']))
+
+	if account.journal:
+		account.journal.add_meeting(meeting)
+
+	return meeting
+
+def use_listed_meeting(account, listed_meeting):
+	if is_meeting_complete(listed_meeting):
+		account.saved_meeting_lookups += 1
+		return True
+
+	return False
+
+def is_meeting_complete(meeting):
+	"""Return if the meeting as listed for its user has everything needed to download its recordings."""
+	if not CONFIG.SKIP_REDUNDANT_MEETING_LOOKUPS:
+		return False
+
+	if 'recording_files' not in meeting:
+		return False
+
+	# Participant audio files are only returned when the meeting recordings are requested directly.
+	if CONFIG.INCLUDE_PARTICIPANT_AUDIO and 'participant_audio_files' not in meeting:
+		return False
+
+	return all('download_url' in recording_file for recording_file in meeting['recording_files'])
+
+def download_recordings_from_meetings(account, meetings, user_email):
+	return process_jobs(job for meeting in meetings for job in get_meeting_download_jobs(account, meeting, user_email))
+
+def download_planned_recordings(plan_path, accounts):
+	utils.print_bright(f'Downloading recordings listed in {plan_path}.')
+	accounts_by_name = {account.name or '': account for account in accounts}
+	jobs = (job_from_plan_entry(entry, accounts_by_name) for entry in plan.read_plan(plan_path))
+	jobs = (job for job in jobs if is_in_shard(job.account, job.file_id))
+
+	return process_jobs(job if is_download_needed(job) else None for job in jobs)
+
+def process_jobs(jobs):
+	"""Download or plan the given jobs, None jobs are counted as skipped files."""
+	skipped_count = 0
+
+	def get_jobs():
+		nonlocal skipped_count
+
+		for job in jobs:
+			if job:
+				yield job
 			else:
 				skipped_count += 1
+
+	if job_plan:
+		file_count, total_size = plan_files(get_jobs())
+	else:
+		file_count, total_size = download_files(scheduler.order_jobs(get_jobs(), CONFIG.DOWNLOAD_ORDER))
 	
 	return file_count, total_size, skipped_count
 
-def download_recording_file(download_url, user_email, file_name, file_size, topic, recording_name):
-	if CONFIG.VERBOSE_OUTPUT:
-		print()
-		utils.print_dim(f'URL: {download_url}')
+def get_meeting_download_jobs(account, meeting, user_email):
+	jobs = []
 
-	file_path = create_path(user_email, file_name, topic, recording_name)
+	recording_files = meeting.get('recording_files') or []
+	participant_audio_files = (meeting.get('participant_audio_files') or []) if CONFIG.INCLUDE_PARTICIPANT_AUDIO else []
 
-	if os.path.exists(file_path) and abs(os.path.getsize(file_path) - file_size) <= CONFIG.FILE_SIZE_MISMATCH_TOLERANCE:
-		utils.print_dim(f'Skipping existing file: {file_name}')
-		return False
-	elif os.path.exists(file_path):
-		utils.print_dim_red(f'Deleting corrupt file: {file_name}')
-		os.remove(file_path)
+	for recording_file in recording_files + participant_audio_files:
+		if 'file_size' not in recording_file:
+			continue
 
-	utils.print_bright(f'Downloading: {file_name}')
-	utils.wait_for_disk_space(
-		file_size, CONFIG.OUTPUT_PATH, CONFIG.MINIMUM_FREE_DISK, poll_interval=5, timeout=CONFIG.USER_INPUT_TIMEOUT
-	)
+		if account.file_types and recording_file['file_type'] not in account.file_types:
+			continue
+
+		if not is_in_shard(account, recording_file['id']):
+			continue
+
+		url = recording_file['download_url']
+		topic = utils.slugify(meeting['topic'])
+		ext = recording_file.get('file_extension') or os.path.splitext(recording_file['file_name'])[1]
+		recording_name = utils.slugify(f'{topic}__{recording_file["recording_start"]}')
+		file_id = recording_file['id']
+		file_name_suffix =  os.path.splitext(recording_file['file_name'])[0] + '__' if 'file_name' in recording_file else ''
+		recording_type_suffix =  recording_file['recording_type'] + '__' if 'recording_type' in recording_file else ''
+		file_name = utils.slugify(
+			f'{recording_name}__{recording_type_suffix}{file_name_suffix}{file_id[-8:]}'
+		) + '.' + ext
+		file_size = int(recording_file['file_size'])
 
-	tmp_file_path = file_path + '.tmp'
-	client.do_with_token(
-		lambda t: utils.download_with_progress(
-			f'{download_url}?access_token={t}', tmp_file_path, file_size, CONFIG.VERBOSE_OUTPUT,
-			CONFIG.FILE_SIZE_MISMATCH_TOLERANCE
+		job = download_job(
+			url, file_id, get_file_path(account, user_email, file_name, topic, recording_name), file_name, file_size,
+			recording_file['file_type'], user_email, meeting['topic'], recording_file['recording_start'], account
 		)
-	)
-	
-	os.rename(tmp_file_path, file_path)
+		jobs.append(job if is_download_needed(job) else None)
+
+	return jobs
+
+def is_in_shard(account, file_id):
+	if not args.shard:
+		return True
+
+	index, count = args.shard
+	if utils.shard_of(file_id, count) == index - 1:
+		return True
+
+	account.other_shards_count += 1
+	return False
+
+def is_download_needed(job):
+	account = job.account
+	if account.journal and account.journal.has_file(job.file_id):
+		utils.print_dim(f'Skipping existing file: {job.file_name}')
+		return False
+
+	# Files known to the manifest are skipped without touching the file system.
+	if account.manifest and account.manifest.has(
+		job.file_id, get_relative_path(job), job.file_size, CONFIG.FILE_SIZE_MISMATCH_TOLERANCE
+	):
+		utils.print_dim(f'Skipping existing file: {job.file_name}')
+		return False
+
+	if os.path.exists(job.file_path) and abs(os.path.getsize(job.file_path) - job.file_size) <= CONFIG.FILE_SIZE_MISMATCH_TOLERANCE:
+		utils.print_dim(f'Skipping existing file: {job.file_name}')
+		if account.manifest:
+			account.manifest.add(job.file_id, get_relative_path(job), os.path.getsize(job.file_path))
+		if account.journal:
+			account.journal.add_file(job.file_id)
+		return False
 
 	return True
 
-def create_path(user_email, file_name, topic, recording_name):
-	folder_path = CONFIG.OUTPUT_PATH
+def get_relative_path(job):
+	return os.path.relpath(job.file_path, job.account.output_path)
+
+def job_to_plan_entry(job):
+	return {
+		'file_id': job.file_id, 'path': get_relative_path(job), 'file_name': job.file_name,
+		'file_size': job.file_size, 'file_type': job.file_type, 'user_email': job.user_email, 'topic': job.topic,
+		'recording_start': job.recording_start, 'url': job.url, 'account': job.account.name or ''
+	}
+
+def job_from_plan_entry(entry, accounts_by_name):
+	account = accounts_by_name.get(entry.get('account') or '')
+	if account is None:
+		raise Exception(f'The plan has files of account "{entry.get("account")}", which is missing from ACCOUNTS.')
+
+	return download_job(
+		entry['url'], entry['file_id'], os.path.join(account.output_path, entry['path']), entry['file_name'],
+		entry['file_size'], entry['file_type'], entry['user_email'], entry['topic'], entry['recording_start'], account
+	)
+
+def plan_files(jobs):
+	file_count, total_size = 0, 0
+
+	for job in jobs:
+		job_plan.write(job_to_plan_entry(job))
+		file_count += 1
+		total_size += job.file_size
+
+	return file_count, total_size
+
+def download_files(jobs):
+	"""Download the files of the given jobs as they come, return the count and total size of the downloaded files."""
+	file_count, total_size = 0, 0
+
+	if download_executor is None:
+		for job in jobs:
+			download_recording_file(job)
+			file_count += 1
+			total_size += job.file_size
+
+		return file_count, total_size
+
+	utils.print_bright(f'Downloading using up to {CONFIG.MAX_PARALLEL_DOWNLOADS} parallel downloads:')
+
+	with utils.aggregate_progress_bar(total=0) as progress_bar:
+		pending = {}
+
+		def wait_for_downloads(return_when):
+			nonlocal file_count, total_size, pending
+
+			done, not_done = concurrent.futures.wait(pending, return_when=return_when)
+			for future in done:
+				future.result()
+				file_count += 1
+				total_size += pending[future].file_size
+			pending = {future: pending[future] for future in not_done}
+
+		try:
+			# Jobs are only taken from the scan a little ahead of the downloads, so memory use stays bounded.
+			for job in jobs:
+				check_cancelled()
+
+				progress_bar.add_total(job.file_size)
+				pending[download_executor.submit(download_recording_file, job, progress_bar)] = job
+				run_metrics.observe('queue_depth', len(pending), queue='downloads')
+				if len(pending) >= CONFIG.MAX_PARALLEL_DOWNLOADS * 2:
+					wait_for_downloads(concurrent.futures.FIRST_COMPLETED)
+
+			wait_for_downloads(concurrent.futures.ALL_COMPLETED)
+		except BaseException:
+			cancel_event.set()
+			for future in pending:
+				future.cancel()
+			concurrent.futures.wait(pending)
+			raise
+
+	return file_count, total_size
+
+def check_cancelled():
+	if cancel_event.is_set():
+		raise InterruptedError('Download cancelled.')
+
+def download_recording_file(job, progress_bar=None):
+	if CONFIG.VERBOSE_OUTPUT:
+		# Downloads can run on worker threads below the progress bar, which only tqdm.write keeps in place.
+		utils.print_dim('')
+		utils.print_dim(f'URL: {job.url}')
+
+	utils.print_bright(f'Downloading: {job.file_name}')
+	if os.path.exists(job.file_path):
+		utils.print_dim_red(f'Deleting corrupt file: {job.file_name}')
+		os.remove(job.file_path)
+	else:
+		os.makedirs(os.path.dirname(job.file_path), exist_ok=True)
+	tmp_file_path = job.file_path + '.tmp'
+	file_reservation = disk_space.reserve(tmp_file_path, job.file_size, cancel_event)
+	run_metrics.observe('disk_space_wait_seconds', file_reservation.wait_time)
+
+	written = False
+	try:
+		client = job.account.client
+		start_time = time.monotonic()
+		try:
+			sha256 = client.do_with_token(
+				lambda t: downloader.download_with_progress(
+					client.session, f'{job.url}?access_token={t}', tmp_file_path, job.file_size, CONFIG.VERBOSE_OUTPUT,
+					CONFIG.FILE_SIZE_MISMATCH_TOLERANCE, CONFIG.DOWNLOAD_CHUNK_SIZE, progress_bar, cancel_event,
+					CONFIG.DOWNLOAD_SEGMENTS, CONFIG.SEGMENTED_DOWNLOAD_THRESHOLD, download_bandwidth
+				)
+			)
+		except Exception as error:
+			if not isinstance(error, InterruptedError):
+				run_metrics.increment('download_failures_total', file_type=job.file_type)
+			raise
+		record_download_metrics(job, time.monotonic() - start_time)
+		
+		os.rename(tmp_file_path, job.file_path)
+		written = True
+		if job.account.manifest:
+			job.account.manifest.add(job.file_id, get_relative_path(job), os.path.getsize(job.file_path), sha256)
+		if job.account.journal:
+			job.account.journal.add_file(job.file_id)
+	finally:
+		disk_space.release(file_reservation, written)
+
+def record_download_metrics(job, download_time):
+	run_metrics.observe('download_seconds', download_time, file_type=job.file_type)
+	run_metrics.increment('downloaded_files_total', file_type=job.file_type)
+	run_metrics.increment('downloaded_bytes_total', job.file_size, file_type=job.file_type)
+	if download_time > 0:
+		run_metrics.observe('download_bytes_per_second', job.file_size / download_time, file_type=job.file_type)
+
+def get_file_path(account, user_email, file_name, topic, recording_name):
+	folder_path = account.output_path
 
 	values = {
 		'USER': user_email,
@@ -274,7 +1013,6 @@ def create_path(user_email, file_name, topic, recording_name):
 		if property in values:
 			folder_path = os.path.join(folder_path, values[property])
 
-	os.makedirs(folder_path, exist_ok=True)
 	return os.path.join(folder_path, file_name)
 
 if __name__ == '__main__':
@@ -302,4 +1040,8 @@ if __name__ == '__main__':
 	except KeyboardInterrupt:
 		print()
 		utils.print_bright_red('Interrupted by the user')
-		exit(1)
\ No newline at end of file
+		exit(1)
+
+	finally:
+		if getattr(CONFIG, 'METRICS_PATH', None):
+			run_metrics.export(CONFIG.METRICS_PATH)
\ No newline at end of file